@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the time each yearly phase takes in a single cell as the number of animals in
+the cell grows. Every phase should scale linearly with the cell population.
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import time
+import numpy as np
+
+from biosim.fauna import Herbivore, Carnivore
+from biosim.landscape import Lowland
+
+POPULATIONS = [10, 100, 1000, 10000, 100000]
+PHASES = ['herbivore_eats', 'carnivore_eats', 'animal_gives_birth', 'migration',
+          'update_animal_weight_and_age', 'animal_dies']
+
+
+def crowded_cell(num_animals, rng):
+    """
+    Creates a lowland cell with num_animals herbivores and a tenth as many carnivores \n
+    :param num_animals: number of herbivores in the cell \n
+    :param rng: numpy random Generator of the cell and of the animal ages and weights \n
+    :return: the lowland cell \n
+    """
+    cell = Lowland(rng=rng)
+    for _ in range(num_animals):
+        cell.add_animal(Herbivore(rng.integers(0, 40), rng.uniform(5, 50)))
+    for _ in range(max(1, num_animals // 10)):
+        cell.add_animal(Carnivore(rng.integers(0, 20), rng.uniform(5, 50)))
+    return cell
+
+
+def time_phase(phase, num_animals, rng):
+    """
+    Times one call of a phase on a fresh crowded cell \n
+    :param phase: name of the Landscape method \n
+    :param num_animals: number of herbivores in the cell \n
+    :param rng: numpy random Generator the cells are created with \n
+    :return: time in seconds \n
+    """
+    cell = crowded_cell(num_animals, rng)
+    args = ([Lowland(rng=rng) for _ in range(4)],) if phase == 'migration' else ()
+    start = time.perf_counter()
+    getattr(cell, phase)(*args)
+    return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(12345)
+    print('{:>30s}'.format('animals') + ''.join('{:>10d}'.format(n) for n in POPULATIONS))
+    for phase in PHASES:
+        times = [time_phase(phase, num_animals, rng) for num_animals in POPULATIONS]
+        print('{:>30s}'.format(phase) + ''.join('{:>10.4f}'.format(t) for t in times))
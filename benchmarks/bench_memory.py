@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark of the memory used per animal by the object engine and the array engine.
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import tracemalloc
+import numpy as np
+
+from biosim.array_island import ArrayIsland
+from biosim.fauna import Herbivore
+from biosim.landscape import Lowland
+
+NUM_ANIMALS = 100000
+
+
+def bytes_per_animal(create):
+    """
+    Measures the memory allocated by create, divided by the number of animals \n
+    :param create: function that creates NUM_ANIMALS animals and returns them \n
+    :return: bytes per animal \n
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    animals = create()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del animals
+    return (after - before) / NUM_ANIMALS
+
+
+def object_cell():
+    """
+    Creates a lowland cell holding NUM_ANIMALS herbivore objects \n
+    """
+    cell = Lowland(rng=np.random.default_rng(1))
+    for weight in np.random.default_rng(1).uniform(5, 50, NUM_ANIMALS).tolist():
+        cell.add_animal(Herbivore(5, weight))
+    return cell
+
+
+def array_island():
+    """
+    Creates an array island holding NUM_ANIMALS herbivores in one cell \n
+    """
+    island = ArrayIsland("WWW\nWLW\nWWW", capacity=NUM_ANIMALS)
+    island.add_animals([{'loc': (2, 2), 'pop': [{'species': 'Herbivore', 'age': 5,
+                                                 'weight': 20.0}] * NUM_ANIMALS}])
+    return island
+
+
+if __name__ == '__main__':
+    print('object engine: {:8.1f} bytes per animal'.format(bytes_per_animal(object_cell)))
+    print('array engine:  {:8.1f} bytes per animal'.format(bytes_per_animal(array_island)))
@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""
+Repeatable benchmarks of the BioSim hot paths: the landscape phases on a single crowded cell,
+a full island year at several map sizes and population densities, and BioSim.simulate with
+and without graphics. Every benchmark uses fixed seeds and a fresh setup for every repeat,
+and only the benchmarked call is timed. The results are stored as JSON, and a run can be
+compared against a saved baseline from the same machine:
+
+    python benchmarks/suite.py --output baseline.json
+    python benchmarks/suite.py --output new.json --baseline baseline.json
+
+A benchmark is flagged as a regression if its best time is more than the tolerance slower
+than in the baseline, and the script then exits with status 1.
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+import numpy as np
+
+from biosim.island import Island
+from biosim.landscape import Lowland
+from biosim.simulation import BioSim
+from bench_cell_phases import crowded_cell
+
+SEED = 12345
+CELL_POPULATIONS = [100, 1000, 10000]
+MAP_SIZES = [5, 11, 21]
+DENSITIES = [10, 50]
+IMAGE_DIR = tempfile.mkdtemp(prefix='biosim_benchmarks_')
+BENCHMARKS = {}
+
+
+def benchmark(name, params=(None,)):
+    """
+    Registers a benchmark. The decorated function is the setup: it gets one of params and \n
+    returns the call to time \n
+    :param name: name of the benchmark, the parameter is added in brackets \n
+    :param params: values the benchmark is run with \n
+    """
+    def register(setup):
+        for param in params:
+            full_name = name if param is None else '{}[{}]'.format(name, param)
+            BENCHMARKS[full_name] = setup, param
+        return setup
+    return register
+
+
+def fed_cell(num_animals):
+    """
+    A crowded cell of bench_cell_phases with the fodder of the start of a year \n
+    :param num_animals: number of herbivores in the cell \n
+    :return: the lowland cell \n
+    """
+    cell = crowded_cell(num_animals, np.random.default_rng(SEED))
+    cell.update_fodder()
+    return cell
+
+
+def square_map(size):
+    """
+    A square island of lowland surrounded by water \n
+    :param size: number of land cells along each side \n
+    :return: map string \n
+    """
+    water = 'W' * (size + 2)
+    return '\n'.join([water] + ['W' + 'L' * size + 'W'] * size + [water])
+
+
+def spread_population(size, density):
+    """
+    A population with the same number of animals in every land cell of square_map \n
+    :param size: number of land cells along each side \n
+    :param density: number of herbivores per cell, with a fifth as many carnivores \n
+    :return: population list in the format of BioSim \n
+    """
+    return [{'loc': (row, col),
+             'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 20}] * density +
+                    [{'species': 'Carnivore', 'age': 5, 'weight': 20}] * (density // 5)}
+            for row in range(2, size + 2) for col in range(2, size + 2)]
+
+
+def cell_phase(phase, *args):
+    """
+    Setup of a landscape phase benchmark \n
+    :param phase: name of the Landscape method \n
+    :param args: arguments of the method \n
+    """
+    def setup(num_animals):
+        cell = fed_cell(num_animals)
+        return lambda: getattr(cell, phase)(*args)
+    return setup
+
+
+for _phase in ('herbivore_eats', 'carnivore_eats', 'animal_gives_birth', 'decide_migration',
+               'update_animal_weight_and_age', 'animal_dies', 'animal_ages_and_dies'):
+    benchmark('landscape.' + _phase, CELL_POPULATIONS)(cell_phase(_phase))
+
+
+@benchmark('landscape.migration', CELL_POPULATIONS)
+def migration(num_animals):
+    cell = fed_cell(num_animals)
+    neighbours = [Lowland(rng=np.random.default_rng(SEED + i)) for i in range(4)]
+    return lambda: cell.migration(neighbours)
+
+
+@benchmark('island.life_cycle', ['{}x{}-{}'.format(size, size, density)
+                                 for size in MAP_SIZES for density in DENSITIES])
+def island_year(param):
+    dims, density = param.split('-')
+    size = int(dims.split('x')[0])
+    island = Island(square_map(size), rng=np.random.default_rng(SEED))
+    island.add_animals(spread_population(size, int(density)))
+    return island.life_cycle_in_rossumoya
+
+
+@benchmark('array_island.life_cycle', ['{}x{}-{}'.format(size, size, density)
+                                       for size in MAP_SIZES for density in DENSITIES])
+def array_island_year(param):
+    from biosim.array_island import ArrayIsland
+    dims, density = param.split('-')
+    size = int(dims.split('x')[0])
+    island = ArrayIsland(square_map(size), rng=np.random.default_rng(SEED))
+    island.add_animals(spread_population(size, int(density)))
+    return island.life_cycle_in_rossumoya
+
+
+@benchmark('biosim.simulate', ['headless', 'graphics'])
+def simulate(mode):
+    if mode == 'headless':
+        sim = BioSim(square_map(5), spread_population(5, 20), seed=SEED)
+        return lambda: sim.simulate(num_years=10, vis_years=None)
+    import matplotlib.pyplot as plt
+    plt.close('all')
+    sim = BioSim(square_map(5), spread_population(5, 20), seed=SEED,
+                 img_base=os.path.join(IMAGE_DIR, 'biosim'))
+    return lambda: sim.simulate(num_years=10, vis_years=1, img_years=5)
+
+
+def measure(setup, param, repeat):
+    """
+    Times a benchmark with a fresh setup for every repeat \n
+    :param setup: the registered setup function \n
+    :param param: parameter of the benchmark \n
+    :param repeat: number of timed calls \n
+    :return: dictionary with the best, median and all times in seconds \n
+    """
+    times = []
+    for _ in range(repeat):
+        call = setup(param)
+        start = time.perf_counter()
+        call()
+        times.append(time.perf_counter() - start)
+    return {'min': min(times), 'median': float(np.median(times)), 'times': times}
+
+
+def run(names, repeat):
+    """
+    Runs the given benchmarks \n
+    :param names: names of registered benchmarks \n
+    :param repeat: number of timed calls per benchmark \n
+    :return: dictionary with the machine description and the results \n
+    """
+    results = {}
+    for name in names:
+        setup, param = BENCHMARKS[name]
+        results[name] = measure(setup, param, repeat)
+        print('{:<45s}{:>12.6f}'.format(name, results[name]['min']), flush=True)
+    return {'machine': {'python': platform.python_version(), 'numpy': np.__version__,
+                        'platform': platform.platform(), 'processor': platform.processor()},
+            'repeat': repeat, 'results': results}
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares the best times of a run with a baseline run \n
+    :param results: the output of run \n
+    :param baseline: the output of an earlier run \n
+    :param tolerance: the relative slowdown that is still accepted, e.g. 0.2 for 20 % \n
+    :return: list of (name, baseline time, new time) of the regressions \n
+    """
+    regressions = []
+    print('{:<45s}{:>12s}{:>12s}{:>8s}'.format('benchmark', 'baseline', 'new', 'ratio'))
+    for name, result in results['results'].items():
+        old = baseline['results'].get(name)
+        if old is None:
+            continue
+        ratio = result['min'] / old['min']
+        flag = 'REGRESSION' if ratio > 1 + tolerance else ''
+        print('{:<45s}{:>12.6f}{:>12.6f}{:>8.2f}  {}'.format(name, old['min'], result['min'],
+                                                            ratio, flag))
+        if flag:
+            regressions.append((name, old['min'], result['min']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks of the BioSim hot paths')
+    parser.add_argument('--output', help='file to store the results in as JSON')
+    parser.add_argument('--baseline', help='JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='accepted relative slowdown before flagging a regression')
+    parser.add_argument('--repeat', type=int, default=5, help='timed calls per benchmark')
+    parser.add_argument('--filter', default='', help='only run benchmarks containing this')
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if args.filter in name]
+    try:
+        results = run(names, args.repeat)
+    finally:
+        shutil.rmtree(IMAGE_DIR, ignore_errors=True)
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump(results, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        print()
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print('{} regression(s) against {}'.format(len(regressions), args.baseline))
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,374 @@
+# -*- coding: utf-8 -*-
+
+"""
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import numpy as np
+from biosim.island import Island, Snapshot
+
+
+class ArrayIsland(Island):
+    """
+    Island where the animals are stored as a structure of arrays instead of Fauna objects. \n
+    Age, weight, cell index and species of every animal on the island are kept in contiguous \n
+    numpy arrays, and every yearly phase is run as batched array operations over the whole \n
+    island. Migration moves all animals in one batch, so no animal can move twice in a year. \n
+    No landscape objects are created, the landscape classes are only used for their \n
+    parameters. \n
+    """
+
+    def __init__(self, map, rng=None, workers=None, pool="thread", debug=False, fauna=None,
+                 landscapes=None, timer=None, capacity=1024):
+        """
+        Constructor for the array based island \n
+        :param map: A string which represents the island, see Island \n
+        :param rng: numpy random Generator all animals on the island draw from \n
+        :param workers: must be None or 1. The array engine runs every phase as one \n
+        vectorized operation over the whole island and has no worker pool, so ValueError \n
+        is raised for more workers \n
+        :param pool: only checked like in Island, since there is no worker pool \n
+        :param debug: if True the population counters are checked against a full recount \n
+        after every year \n
+        :param fauna: animal classes of the island, see Island \n
+        :param landscapes: landscape classes of the island, see Island \n
+        :param timer: PhaseTimer that measures every phase, see Island. All phases of the \n
+        array engine work on the whole island and are recorded with the landscape 'Island' \n
+        :param capacity: Initial number of animals the arrays have room for \n
+        """
+        if pool not in ('process', 'thread'):
+            raise ValueError("pool must be 'process' or 'thread'")
+        if workers is not None and workers > 1:
+            raise ValueError("The array engine does not run in a worker pool")
+        self.workers = workers
+        self.pool = pool
+        self.setup_map(map, rng, debug, fauna, landscapes, timer)
+        self.species_classes = list(self.fauna_dict_island.values())
+        self.species_codes = {species: code for code, species in
+                              enumerate(self.fauna_dict_island)}
+
+        rows, cols = self.map_dims
+        self.num_cells = rows * cols
+        self._landscape_code = np.unique(self.island_map, return_inverse=True)[1].ravel()
+        self._fodder = np.zeros(self.num_cells)
+        self._size = 0
+        self._age = np.zeros(capacity, dtype=np.int64)
+        self._weight = np.zeros(capacity)
+        self._cell = np.zeros(capacity, dtype=np.int64)
+        self._species = np.zeros(capacity, dtype=np.int8)
+        self._counts = np.zeros((len(self.species_classes), self.num_cells), dtype=int)
+        self._totals = np.zeros(len(self.species_classes), dtype=int)
+
+    def _append(self, age, weight, cell, species):
+        """
+        Appends a batch of animals to the arrays, growing them when they are full \n
+        :param age: array with ages \n
+        :param weight: array with weights \n
+        :param cell: array with flat cell indices \n
+        :param species: array with species codes \n
+        """
+        start = self._size
+        stop = start + len(age)
+        if stop > len(self._age):
+            capacity = max(stop, 2 * len(self._age))
+            for name in ('_age', '_weight', '_cell', '_species'):
+                old = getattr(self, name)
+                new = np.zeros(capacity, dtype=old.dtype)
+                new[:start] = old[:start]
+                setattr(self, name, new)
+        self._age[start:stop] = age
+        self._weight[start:stop] = weight
+        self._cell[start:stop] = cell
+        self._species[start:stop] = species
+        self._size = stop
+        np.add.at(self._counts, (species, cell), 1)
+        self._totals += np.bincount(species, minlength=len(self._totals))
+
+    def _keep(self, survivors):
+        """
+        Compacts the arrays so that only the animals in the survivors mask are kept \n
+        :param survivors: boolean mask over the living animals \n
+        """
+        n = self._size
+        removed = ~survivors
+        np.subtract.at(self._counts, (self._species[:n][removed], self._cell[:n][removed]), 1)
+        self._totals -= np.bincount(self._species[:n][removed], minlength=len(self._totals))
+        keep = np.flatnonzero(survivors)
+        for array in (self._age, self._weight, self._cell, self._species):
+            array[:len(keep)] = array[keep]
+        self._size = len(keep)
+
+    def _parameter(self, name):
+        """
+        Looks up a species parameter for every living animal \n
+        :param name: parameter name \n
+        :return: array with the parameter value of each animal's species \n
+        """
+        values = np.array([species.parameters[name] for species in self.species_classes])
+        return values[self._species[:self._size]]
+
+    def _fitness(self):
+        """
+        Calculates the fitness of every living animal \n
+        :return: array with the fitness of the animals \n
+        """
+        n = self._size
+        fitness = np.zeros(n)
+        for code, species in enumerate(self.species_classes):
+            mask = self._species[:n] == code
+            fitness[mask] = species.fitness_array(self._age[:n][mask], self._weight[:n][mask])
+        return fitness
+
+    @property
+    def occupied_cells(self):
+        """
+        The land cells that currently hold animals, in row-major order, read from the \n
+        population counters \n
+        :return: list of (row, col) tuples \n
+        """
+        cols = self.map_dims[1]
+        return [divmod(cell, cols) for cell in np.flatnonzero(self._counts.sum(axis=0)).tolist()]
+
+    def close(self):
+        """
+        Nothing to shut down, the array engine has no worker pool \n
+        """
+
+    def add_animals(self, population):
+        """
+        Adds animals to the given cells on the map \n
+        :param population: a dictionary with the population information to be added to the island \n
+        """
+        rows, cols = self.map_dims
+        for animal_group in population:
+            x = animal_group["loc"][0] - 1
+            y = animal_group["loc"][1] - 1
+            if not self.migratable[x * cols + y]:
+                raise ValueError("Animals cannot be placed in water")
+            animals = animal_group["pop"]
+            age = np.array([animal["age"] for animal in animals], dtype=np.int64)
+            weight = np.array([animal["weight"] for animal in animals], dtype=float)
+            species = np.array([self.species_codes[animal["species"]] for animal in animals],
+                               dtype=np.int8)
+            if np.any(weight < 0):
+                raise ValueError("Weight cannot be negative")
+            if np.any(age < 0):
+                raise ValueError("Age cannot be negative")
+            self._append(age, weight, np.full(len(animals), x * cols + y), species)
+
+    def life_cycle_in_rossumoya(self):
+        """
+        Performs the life cycle events for all animals on the island, one phase at a time. \n
+        This should be called every year \n
+        """
+        for phase in ("update_fodder", "herbivore_eats", "carnivore_eats", "animal_gives_birth",
+                      "migration", "update_animal_weight_and_age", "animal_dies"):
+            self.run_phase(phase)
+        if self.debug:
+            self.check_counters()
+
+    def update_fodder(self):
+        """
+        Resets the fodder in every cell to f_max of its landscape type \n
+        """
+        letters = np.unique(self.island_map)
+        f_max = np.array([self.landscape_dict[letter].parameters.get('f_max', 0)
+                          for letter in letters], dtype=float)
+        self._fodder = f_max[self._landscape_code]
+
+    def herbivore_eats(self):
+        """
+        Herbivores eat in random order within each cell. Since all herbivores have the same \n
+        appetite F, the k-th herbivore in a cell gets what is left after k others have eaten \n
+        """
+        n = self._size
+        herbs = np.flatnonzero(self._species[:n] == self.species_codes['Herbivore'])
+        if len(herbs) == 0:
+            return
+        herbs = herbs[self.rng.permutation(len(herbs))]
+        herbs = herbs[np.argsort(self._cell[herbs], kind='stable')]
+        cells = self._cell[herbs]
+
+        group_starts = np.flatnonzero(np.r_[True, cells[1:] != cells[:-1]])
+        group_sizes = np.diff(np.r_[group_starts, len(cells)])
+        rank = np.arange(len(cells)) - np.repeat(group_starts, group_sizes)
+
+        params = self.fauna_dict_island['Herbivore'].parameters
+        eaten = np.clip(self._fodder[cells] - rank * params['F'], 0, params['F'])
+        self._weight[herbs] += params['beta'] * eaten
+        self._fodder -= np.bincount(cells, weights=eaten, minlength=self.num_cells)
+
+    def carnivore_eats(self):
+        """
+        In each cell the carnivores eat in order of decreasing fitness and try to kill the \n
+        herbivores in order of increasing fitness until their appetite is met, see \n
+        Carnivore.hunt \n
+        """
+        n = self._size
+        carns = np.flatnonzero(self._species[:n] == self.species_codes['Carnivore'])
+        herbs = np.flatnonzero(self._species[:n] == self.species_codes['Herbivore'])
+        if len(carns) == 0 or len(herbs) == 0:
+            return
+
+        carnivore = self.fauna_dict_island['Carnivore']
+        herb_fitness = self.fauna_dict_island['Herbivore'].fitness_array(self._age[herbs],
+                                                                         self._weight[herbs])
+        herb_order = np.argsort(self._cell[herbs], kind='stable')
+        herbs, herb_fitness = herbs[herb_order], herb_fitness[herb_order]
+        carns = carns[np.argsort(self._cell[carns], kind='stable')]
+        herb_cells = self._cell[herbs]
+        carn_cells = self._cell[carns]
+
+        alive = np.ones(n, dtype=bool)
+        for cell in np.unique(carn_cells):
+            lo, hi = np.searchsorted(herb_cells, [cell, cell + 1])
+            if lo == hi:
+                continue
+            prey = herbs[lo:hi]
+            c_lo, c_hi = np.searchsorted(carn_cells, [cell, cell + 1])
+            hunters = carns[c_lo:c_hi]
+            food_eaten, killed = carnivore.hunt(self._age[hunters], self._weight[hunters],
+                                                herb_fitness[lo:hi], self._weight[prey],
+                                                self.rng)
+            self._weight[hunters] += carnivore.parameters['beta'] * food_eaten
+            alive[prey[killed]] = False
+        self._keep(alive)
+
+    def animal_gives_birth(self):
+        """
+        Every animal with enough weight and at least one other animal of the same species in \n
+        its cell gives birth with probability min(1, gamma * fitness * (N - 1)). A birth only \n
+        happens if the mother weighs more than xi times the weight of the child \n
+        """
+        n = self._size
+        fitness = self._fitness()
+        cells = self._cell[:n]
+        for code, species in enumerate(self.species_classes):
+            params = species.parameters
+            parents = np.flatnonzero(self._species[:n] == code)
+            if len(parents) < 2:
+                continue
+            num_same = np.bincount(cells[parents], minlength=self.num_cells)[cells[parents]]
+            birth_proba = np.minimum(1, params["gamma"] * fitness[parents] * (num_same - 1))
+            weight_check = params["zeta"] * (params["w_birth"] + params["sigma_birth"])
+            can_give_birth = (num_same >= 2) & (self._weight[parents] > weight_check)
+            gives_birth = can_give_birth & (self.rng.random(len(parents)) < birth_proba)
+
+            mothers = parents[gives_birth]
+            child_weight = self.rng.normal(params["w_birth"], params["sigma_birth"],
+                                            len(mothers))
+            heavy_enough = self._weight[mothers] > child_weight * params["xi"]
+            mothers = mothers[heavy_enough]
+            child_weight = child_weight[heavy_enough]
+            self._weight[mothers] -= child_weight * params["xi"]
+            self._append(np.zeros(len(mothers), dtype=np.int64), child_weight,
+                         self._cell[mothers], np.full(len(mothers), code, dtype=np.int8))
+
+    def migration(self):
+        """
+        Every animal moves with probability mu * fitness to one of its adjacent cells, chosen \n
+        with equal probability from the neighbour index of the island. Moves into water are \n
+        discarded using the migratable mask \n
+        """
+        n = self._size
+        moves = self.rng.random(n) < self._parameter("mu") * self._fitness()
+        movers = np.flatnonzero(moves)
+        origin = self._cell[movers]
+        direction = self.rng.integers(np.diff(self.neighbour_ptr)[origin])
+        target = self.neighbour_ids[self.neighbour_ptr[origin] + direction]
+        can_move = self.migratable[target]
+        movers, origin, target = movers[can_move], origin[can_move], target[can_move]
+        np.subtract.at(self._counts, (self._species[movers], origin), 1)
+        np.add.at(self._counts, (self._species[movers], target), 1)
+        self._cell[movers] = target
+
+    def update_animal_weight_and_age(self):
+        """
+        Each year the animals ages by 1 and loses weight by a factor of eta \n
+        """
+        n = self._size
+        self._age[:n] += 1
+        self._weight[:n] -= self._parameter("eta") * self._weight[:n]
+
+    def animal_dies(self):
+        """
+        Animals with zero fitness die, the others die with probability omega * (1 - fitness) \n
+        """
+        n = self._size
+        fitness = self._fitness()
+        dies = (fitness <= 0) | (self.rng.random(n) < self._parameter("omega")
+                                 * (1 - fitness))
+        self._keep(~dies)
+
+    def get_state(self):
+        """
+        Collects the full state of the island for a checkpoint: the animal arrays, the \n
+        fodder and the state of the random generator \n
+        :return: dictionary of arrays and dictionary of JSON serialisable values \n
+        """
+        n = self._size
+        arrays = {'age': self._age[:n].copy(), 'weight': self._weight[:n].copy(),
+                  'cell': self._cell[:n].copy(), 'species': self._species[:n].copy(),
+                  'fodder': self._fodder.copy()}
+        return arrays, {'rng': self.rng.bit_generator.state}
+
+    def set_state(self, arrays, state):
+        """
+        Restores a state collected by get_state on an island with the same map \n
+        :param arrays: dictionary of arrays from get_state \n
+        :param state: dictionary of values from get_state \n
+        """
+        self.rng.bit_generator.state = state['rng']
+        self._size = 0
+        self._counts[:] = 0
+        self._totals[:] = 0
+        self._append(arrays['age'], arrays['weight'], arrays['cell'], arrays['species'])
+        self._fodder = arrays['fodder'].astype(float)
+
+    def number_of_animals_per_species(self, species):
+        """
+        The total amount of animals per species on the island, read from the population \n
+        counters \n
+        :param species: name of the species \n
+        :return: The total number of animals on the island \n
+        """
+        return int(self._totals[self.species_codes[species]])
+
+    def count_map(self, species):
+        """
+        Counts the animals of a species in every cell, read from the population counters \n
+        :param species: name of the species \n
+        :return: array with the same shape as the map with the animal count per cell \n
+        """
+        return self._counts[self.species_codes[species]].reshape(self.map_dims).copy()
+
+    def check_counters(self):
+        """
+        Compares the population counters with a full recount of the arrays. Raises \n
+        RuntimeError if they differ \n
+        """
+        n = self._size
+        for species, code in self.species_codes.items():
+            mask = self._species[:n] == code
+            recount = np.bincount(self._cell[:n][mask], minlength=self.num_cells)
+            if not np.array_equal(recount, self._counts[code]) or \
+                    recount.sum() != self._totals[code]:
+                raise RuntimeError('The ' + species + ' counters do not match the recount')
+
+    def snapshot(self):
+        """
+        Collects the animal count per cell from the population counters, and the age, weight \n
+        and fitness of every animal straight from the arrays \n
+        :return: Snapshot of the population \n
+        """
+        n = self._size
+        fitness = self._fitness()
+        snapshot = Snapshot({}, {}, {}, {})
+        for species, code in self.species_codes.items():
+            mask = self._species[:n] == code
+            snapshot.counts[species] = self.count_map(species)
+            snapshot.age[species] = self._age[:n][mask]
+            snapshot.weight[species] = self._weight[:n][mask]
+            snapshot.fitness[species] = fitness[mask]
+        return snapshot
@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+
+"""
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+from math import erf, sqrt
+
+import numpy as np
+from biosim.island import Island, Snapshot
+from biosim.landscape import Water
+
+
+class CohortIsland(Island):
+    """
+    Island where the animals are stored as cohorts instead of individuals: every row of the \n
+    cohort arrays holds the number of animals of one species with the same age and weight in \n
+    one cell. Weights are kept on a grid with spacing weight_step, and a weight that falls \n
+    between two grid points is rounded up or down at random in proportion to the distance, \n
+    so the mean weight is kept. Every yearly phase draws the fate of whole cohorts with \n
+    binomial, multinomial and hypergeometric draws, using the fitness formulas of Fauna, so \n
+    the cost grows with the number of cohorts and not with the number of animals. Feeding of \n
+    the herbivores, birth, migration, ageing and death follow the individual based model \n
+    exactly up to the weight grid. The hunt is a mean-field approximation, see \n
+    carnivore_eats. \n
+    """
+
+    def __init__(self, map, rng=None, workers=None, pool="thread", debug=False, fauna=None,
+                 landscapes=None, timer=None, weight_step=0.5):
+        """
+        Constructor for the cohort based island \n
+        :param map: A string which represents the island, see Island \n
+        :param rng: numpy random Generator all cohorts on the island draw from \n
+        :param workers: accepted for compatibility with Island and ignored \n
+        :param pool: accepted for compatibility with Island and ignored \n
+        :param debug: if True the cohorts are checked after every year \n
+        :param fauna: animal classes of the island, see Island \n
+        :param landscapes: landscape classes of the island, see Island \n
+        :param timer: PhaseTimer that measures every phase, see Island. All phases of the \n
+        cohort engine work on the whole island and are recorded with the landscape 'Island' \n
+        :param weight_step: spacing of the weight grid \n
+        """
+        if weight_step <= 0:
+            raise ValueError("weight_step must be positive")
+        super().__init__(map, rng, workers, pool, debug, fauna, landscapes, timer)
+        self.weight_step = weight_step
+        self.species_classes = list(self.fauna_dict_island.values())
+        self.species_codes = {species: code for code, species in
+                              enumerate(self.fauna_dict_island)}
+
+        rows, cols = self.map_dims
+        self.num_cells = rows * cols
+        self._landscape_code = np.unique(self.island_map, return_inverse=True)[1].ravel()
+        self._fodder = np.zeros(self.num_cells)
+        empty = np.zeros(0, dtype=np.int64)
+        self._species, self._cell, self._age, self._bin, self._count = (empty,) * 5
+
+    @property
+    def num_cohorts(self):
+        """
+        :return: the number of cohorts on the island \n
+        """
+        return len(self._count)
+
+    def _weight(self):
+        """
+        :return: array with the weight of every cohort \n
+        """
+        return self._bin * self.weight_step
+
+    def _rows(self, mask=None, **changes):
+        """
+        Selects cohort rows, optionally with some columns replaced \n
+        :param mask: boolean mask or index array of the rows, all rows if None \n
+        :param changes: new values for the columns 'species', 'cell', 'age', 'bin' or 'count' \n
+        :return: tuple of species, cell, age, bin and count arrays \n
+        """
+        columns = []
+        for name in ('species', 'cell', 'age', 'bin', 'count'):
+            if name in changes:
+                columns.append(np.asarray(changes[name], dtype=np.int64))
+            elif mask is None:
+                columns.append(getattr(self, '_' + name))
+            else:
+                columns.append(getattr(self, '_' + name)[mask])
+        return tuple(columns)
+
+    def _rebin(self, rows, weight):
+        """
+        Puts cohorts with new weights onto the weight grid. Each cohort is split between the \n
+        grid points below and above its weight with a binomial draw \n
+        :param rows: tuple of species, cell, age, bin and count arrays, see _rows \n
+        :param weight: array with the new weight of every row \n
+        :return: tuple of species, cell, age, bin and count arrays with twice as many rows \n
+        """
+        species, cell, age, _, count = rows
+        position = np.maximum(weight, 0) / self.weight_step
+        lower = np.floor(position).astype(np.int64)
+        upper = self.rng.binomial(count, position - lower)
+        return (np.r_[species, species], np.r_[cell, cell], np.r_[age, age],
+                np.r_[lower, lower + 1], np.r_[count - upper, upper])
+
+    def _set(self, *parts):
+        """
+        Replaces the cohorts with the given rows. Rows of the same species, cell, age and \n
+        weight are merged, empty rows are dropped, and the rows are sorted by species and cell \n
+        :param parts: tuples of species, cell, age, bin and count arrays \n
+        """
+        species, cell, age, weight_bin, count = (np.concatenate(column) for column in
+                                                 zip(*parts))
+        keep = count > 0
+        species, cell, age, weight_bin, count = (species[keep], cell[keep], age[keep],
+                                                 weight_bin[keep], count[keep])
+        order = np.lexsort((weight_bin, age, cell, species))
+        species, cell, age, weight_bin, count = (species[order], cell[order], age[order],
+                                                 weight_bin[order], count[order])
+        if len(count) == 0:
+            starts = np.zeros(0, dtype=np.int64)
+        else:
+            new = np.r_[True, (species[1:] != species[:-1]) | (cell[1:] != cell[:-1]) |
+                        (age[1:] != age[:-1]) | (weight_bin[1:] != weight_bin[:-1])]
+            starts = np.flatnonzero(new)
+        self._species, self._cell, self._age, self._bin = (species[starts], cell[starts],
+                                                           age[starts], weight_bin[starts])
+        self._count = np.add.reduceat(count, starts) if len(starts) else count[starts]
+
+    def _fitness(self):
+        """
+        Calculates the fitness of every cohort \n
+        :return: array with the fitness of the cohorts \n
+        """
+        fitness = np.zeros(self.num_cohorts)
+        weight = self._weight()
+        for code, species in enumerate(self.species_classes):
+            mask = self._species == code
+            fitness[mask] = species.fitness_array(self._age[mask], weight[mask])
+        return fitness
+
+    def _parameter(self, name):
+        """
+        Looks up a species parameter for every cohort \n
+        :param name: parameter name \n
+        :return: array with the parameter value of each cohort's species \n
+        """
+        values = np.array([species.parameters[name] for species in self.species_classes])
+        return values[self._species]
+
+    def add_animals(self, population):
+        """
+        Adds animals to the given cells on the map \n
+        :param population: a dictionary with the population information to be added to the island \n
+        """
+        cols = self.map_dims[1]
+        parts = [self._rows()]
+        for animal_group in population:
+            x = animal_group["loc"][0] - 1
+            y = animal_group["loc"][1] - 1
+            if isinstance(self._cells[x, y], Water):
+                raise ValueError("Animals cannot be placed in water")
+            animals = animal_group["pop"]
+            age = np.array([animal["age"] for animal in animals], dtype=np.int64)
+            weight = np.array([animal["weight"] for animal in animals], dtype=float)
+            species = [self.species_codes[animal["species"]] for animal in animals]
+            if np.any(weight < 0):
+                raise ValueError("Weight cannot be negative")
+            if np.any(age < 0):
+                raise ValueError("Age cannot be negative")
+            rows = self._rows(species=species, cell=np.full(len(animals), x * cols + y),
+                              age=age, bin=np.zeros(len(animals)),
+                              count=np.ones(len(animals)))
+            parts.append(self._rebin(rows, weight))
+        self._set(*parts)
+
+    def life_cycle_in_rossumoya(self):
+        """
+        Performs the life cycle events for all cohorts on the island, one phase at a time. \n
+        This should be called every year \n
+        """
+        for phase in ("update_fodder", "herbivore_eats", "carnivore_eats", "animal_gives_birth",
+                      "migration", "update_animal_weight_and_age", "animal_dies"):
+            self.run_phase(phase)
+        if self.debug:
+            self.check_counters()
+
+    def update_fodder(self):
+        """
+        Resets the fodder in every cell to f_max of its landscape type \n
+        """
+        letters = np.unique(self.island_map)
+        f_max = np.array([self.landscape_dict[letter].parameters.get('f_max', 0)
+                          for letter in letters], dtype=float)
+        self._fodder = f_max[self._landscape_code]
+
+    def herbivore_eats(self):
+        """
+        Herbivores eat in random order, so when there is not enough fodder in a cell for all \n
+        of them, the floor(fodder / F) herbivores that eat F and the one that eats the rest \n
+        are drawn from the cohorts of the cell with multivariate hypergeometric draws \n
+        """
+        herbs = np.flatnonzero(self._species == self.species_codes['Herbivore'])
+        if len(herbs) == 0:
+            return
+        params = self.fauna_dict_island['Herbivore'].parameters
+        cells, counts = self._cell[herbs], self._count[herbs]
+        num_herbs = np.bincount(cells, weights=counts, minlength=self.num_cells)
+
+        full = counts.copy()
+        partial = np.zeros(len(herbs), dtype=np.int64)
+        rest = np.zeros(self.num_cells)
+        for cell in np.flatnonzero(num_herbs * params['F'] > self._fodder):
+            lo, hi = np.searchsorted(cells, [cell, cell + 1])
+            num_full = int(self._fodder[cell] // params['F'])
+            rest[cell] = self._fodder[cell] - num_full * params['F']
+            fed = self.rng.multivariate_hypergeometric(counts[lo:hi],
+                                                       num_full + (rest[cell] > 0))
+            if rest[cell] > 0:
+                partial[lo:hi] = self.rng.multivariate_hypergeometric(fed, 1)
+            full[lo:hi] = fed - partial[lo:hi]
+        eaten = np.bincount(cells, weights=full * params['F'] + partial * rest[cells],
+                            minlength=self.num_cells)
+        self._fodder -= eaten
+
+        weight = self._weight()[herbs]
+        others = self._species != self.species_codes['Herbivore']
+        self._set(self._rows(others),
+                  self._rows(herbs, count=counts - full - partial),
+                  self._rebin(self._rows(herbs, count=full),
+                              weight + params['beta'] * params['F']),
+                  self._rebin(self._rows(herbs, count=partial),
+                              weight + params['beta'] * rest[cells]))
+
+    def carnivore_eats(self):
+        """
+        In each cell the carnivore cohorts hunt in order of decreasing fitness and try the \n
+        herbivore cohorts in order of increasing fitness. This is a mean-field version of \n
+        Carnivore.hunt: a herbivore that is tried by the n hungry carnivores of a cohort is \n
+        killed with probability 1 - (1 - p)^n, where p is the kill probability of one \n
+        carnivore, the kills stop as soon as the cohort has eaten n * F, and the food is \n
+        shared equally by the carnivores of the cohort \n
+        """
+        carns = np.flatnonzero(self._species == self.species_codes['Carnivore'])
+        herbs = np.flatnonzero(self._species == self.species_codes['Herbivore'])
+        if len(carns) == 0 or len(herbs) == 0:
+            return
+        params = self.fauna_dict_island['Carnivore'].parameters
+        if params['DeltaPhiMax'] <= 0:
+            raise ValueError("DeltaPhiMax must be strictly positive")
+        fitness = self._fitness()
+        weight = self._weight()
+        herb_cells, carn_cells = self._cell[herbs], self._cell[carns]
+        survivors = self._count.copy()
+        food = np.zeros(len(carns))
+
+        for cell in np.intersect1d(carn_cells, herb_cells):
+            lo, hi = np.searchsorted(herb_cells, [cell, cell + 1])
+            prey = herbs[lo:hi][np.argsort(fitness[herbs[lo:hi]], kind='stable')]
+            prey_fitness, prey_weight = fitness[prey], weight[prey]
+            c_lo, c_hi = np.searchsorted(carn_cells, [cell, cell + 1])
+            for carn in c_lo + np.argsort(-fitness[carns[c_lo:c_hi]], kind='stable'):
+                hunters = self._count[carns[carn]]
+                catchable = np.searchsorted(prey_fitness, fitness[carns[carn]])
+                if catchable == 0:
+                    continue
+                kill_proba = np.minimum(1, (fitness[carns[carn]] - prey_fitness[:catchable]) /
+                                        params['DeltaPhiMax'])
+                kills = self.rng.binomial(survivors[prey[:catchable]],
+                                          1 - (1 - kill_proba) ** hunters)
+                appetite = hunters * params['F']
+                eaten = np.cumsum(kills * prey_weight[:catchable])
+                if len(eaten) and eaten[-1] > appetite:
+                    last = np.searchsorted(eaten, appetite)
+                    before = eaten[last - 1] if last > 0 else 0
+                    if prey_weight[last] > 0:
+                        needed = int(np.ceil((appetite - before) / prey_weight[last]))
+                        kills[last] = min(kills[last], needed)
+                    kills[last + 1:] = 0
+                survivors[prey[:catchable]] -= kills
+                food[carn] = min(appetite, np.sum(kills * prey_weight[:catchable]))
+
+        gain = params['beta'] * food / self._count[carns]
+        self._count = survivors
+        others = self._species != self.species_codes['Carnivore']
+        self._set(self._rows(others), self._rebin(self._rows(carns), weight[carns] + gain))
+
+    def child_weights(self, species):
+        """
+        The distribution of the birth weight of a species on the weight grid. The normal \n
+        distribution of Fauna is split into the intervals around the grid points, with the \n
+        tails put on the first and last point \n
+        :param species: animal class \n
+        :return: array with the grid index and array with the probability of every point \n
+        """
+        params = species.parameters
+        mean, sigma = params["w_birth"], params["sigma_birth"]
+        last = int(np.ceil((mean + 6 * sigma) / self.weight_step))
+        grid = np.arange(last + 1)
+        edges = (grid[1:] - 0.5) * self.weight_step
+        if sigma > 0:
+            cdf = np.array([0.5 * (1 + erf((edge - mean) / (sigma * sqrt(2))))
+                            for edge in edges])
+        else:
+            cdf = (edges > mean).astype(float)
+        return grid, np.diff(np.r_[0, cdf, 1])
+
+    def animal_gives_birth(self):
+        """
+        In every cohort with enough weight and at least one other animal of the same species \n
+        in its cell, the number of mothers is drawn from a binomial distribution with \n
+        probability min(1, gamma * fitness * (N - 1)), and their children are spread over \n
+        the weight grid with a multinomial draw. A birth only happens if the mother weighs \n
+        more than xi times the weight of the child \n
+        """
+        fitness = self._fitness()
+        weight = self._weight()
+        parts = []
+        for code, species in enumerate(self.species_classes):
+            params = species.parameters
+            rows = np.flatnonzero(self._species == code)
+            if self._count[rows].sum() < 2:
+                parts.append(self._rows(rows))
+                continue
+            cells = self._cell[rows]
+            num_same = np.bincount(cells, weights=self._count[rows],
+                                   minlength=self.num_cells)[cells]
+            birth_proba = np.minimum(1, params["gamma"] * fitness[rows] * (num_same - 1))
+            weight_check = params["zeta"] * (params["w_birth"] + params["sigma_birth"])
+            can_give_birth = (num_same >= 2) & (weight[rows] > weight_check)
+            mothers = self.rng.binomial(self._count[rows], np.where(can_give_birth,
+                                                                    birth_proba, 0))
+
+            grid, proba = self.child_weights(species)
+            children = self.rng.multinomial(mothers, proba)
+            child_weight = grid * self.weight_step
+            heavy_enough = weight[rows][:, None] > params["xi"] * child_weight[None, :]
+            children = np.where(heavy_enough, children, 0)
+
+            row, point = np.nonzero(children)
+            births = children[row, point]
+            parts.append(self._rows(rows, count=self._count[rows] - children.sum(axis=1)))
+            parts.append(self._rebin(self._rows(rows[row], count=births),
+                                     weight[rows][row] - params["xi"] * child_weight[point]))
+            parts.append(self._rows(rows[row], age=np.zeros(len(row)), bin=grid[point],
+                                    count=births))
+        self._set(*parts)
+
+    def migration(self):
+        """
+        In every cohort the number of movers is drawn from a binomial distribution with \n
+        probability mu * fitness, and the movers are spread over the adjacent cells with a \n
+        multinomial draw. Movers that pick water stay in their cell \n
+        """
+        movers = self.rng.binomial(self._count, self._parameter("mu") * self._fitness())
+        ptr = self.neighbour_ptr[self._cell]
+        num_neighbours = np.diff(self.neighbour_ptr)[self._cell]
+        parts = []
+        stay = self._count.copy()
+        for degree in np.unique(num_neighbours):
+            rows = np.flatnonzero((num_neighbours == degree) & (movers > 0))
+            if degree == 0 or len(rows) == 0:
+                continue
+            moves = self.rng.multinomial(movers[rows], np.full(degree, 1 / degree))
+            targets = self.neighbour_ids[ptr[rows][:, None] + np.arange(degree)]
+            moves = np.where(self.migratable[targets], moves, 0)
+            stay[rows] -= moves.sum(axis=1)
+            row, direction = np.nonzero(moves)
+            parts.append(self._rows(rows[row], cell=targets[row, direction],
+                                    count=moves[row, direction]))
+        self._set(self._rows(count=stay), *parts)
+
+    def update_animal_weight_and_age(self):
+        """
+        Each year the animals ages by 1 and loses weight by a factor of eta \n
+        """
+        weight = self._weight() * (1 - self._parameter("eta"))
+        self._set(self._rebin(self._rows(age=self._age + 1), weight))
+
+    def animal_dies(self):
+        """
+        Animals with zero fitness die, in the other cohorts the number of deaths is drawn \n
+        from a binomial distribution with probability omega * (1 - fitness) \n
+        """
+        fitness = self._fitness()
+        death_proba = np.where(fitness <= 0, 1, self._parameter("omega") * (1 - fitness))
+        deaths = self.rng.binomial(self._count, death_proba)
+        self._set(self._rows(count=self._count - deaths))
+
+    def get_state(self):
+        """
+        Collects the full state of the island for a checkpoint: the cohorts, the fodder and \n
+        the state of the random generator \n
+        :return: dictionary of arrays and dictionary of JSON serialisable values \n
+        """
+        arrays = {'species': self._species.copy(), 'cell': self._cell.copy(),
+                  'age': self._age.copy(), 'bin': self._bin.copy(),
+                  'count': self._count.copy(), 'fodder': self._fodder.copy()}
+        return arrays, {'rng': self.rng.bit_generator.state, 'weight_step': self.weight_step}
+
+    def set_state(self, arrays, state):
+        """
+        Restores a state collected by get_state on an island with the same map \n
+        :param arrays: dictionary of arrays from get_state \n
+        :param state: dictionary of values from get_state \n
+        """
+        self.rng.bit_generator.state = state['rng']
+        self.weight_step = state['weight_step']
+        self._set((arrays['species'], arrays['cell'], arrays['age'], arrays['bin'],
+                   arrays['count']))
+        self._fodder = arrays['fodder'].astype(float)
+
+    def number_of_animals_per_species(self, species):
+        """
+        The total amount of animals per species on the island \n
+        :param species: name of the species \n
+        :return: The total number of animals on the island \n
+        """
+        return int(self._count[self._species == self.species_codes[species]].sum())
+
+    def count_map(self, species):
+        """
+        Counts the animals of a species in every cell \n
+        :param species: name of the species \n
+        :return: array with the same shape as the map with the animal count per cell \n
+        """
+        mask = self._species == self.species_codes[species]
+        counts = np.bincount(self._cell[mask], weights=self._count[mask],
+                             minlength=self.num_cells)
+        return counts.astype(int).reshape(self.map_dims)
+
+    def check_counters(self):
+        """
+        The counts are read straight from the cohorts, so this checks that every cohort holds \n
+        at least one animal and that no two cohorts have the same species, cell, age and \n
+        weight. Raises RuntimeError otherwise \n
+        """
+        if np.any(self._count <= 0):
+            raise RuntimeError('Empty cohorts were not removed')
+        keys = np.stack(self._rows()[:4])
+        if len(self._count) and len(np.unique(keys, axis=1).T) != len(self._count):
+            raise RuntimeError('Cohorts with the same species, cell, age and weight')
+
+    def snapshot(self):
+        """
+        Collects the animal count per cell, and the age, weight and fitness of every cohort. \n
+        The values are not repeated once per animal, repeats holds the number of animals of \n
+        every cohort instead, so the snapshot grows with the number of cohorts \n
+        :return: Snapshot of the population \n
+        """
+        fitness = self._fitness()
+        weight = self._weight()
+        snapshot = Snapshot({}, {}, {}, {}, {})
+        for species, code in self.species_codes.items():
+            mask = self._species == code
+            snapshot.counts[species] = self.count_map(species)
+            snapshot.age[species] = self._age[mask]
+            snapshot.weight[species] = weight[mask]
+            snapshot.fitness[species] = fitness[mask]
+            snapshot.repeats[species] = self._count[mask]
+        return snapshot
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+"""
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+from biosim.simulation import BioSim
+
+
+def run_replicate(island_map, ini_pop, seed, num_years, engine, parameters):
+    """
+    Runs one replicate without graphics. This is a module level function so that it can be \n
+    sent to worker processes \n
+    :param island_map: Multi-line string specifying island geography \n
+    :param ini_pop: List of dictionaries specifying initial population \n
+    :param seed: seed of the replicate, e.g. a spawned numpy SeedSequence \n
+    :param num_years: number of years to simulate \n
+    :param engine: 'object', 'array' or 'cohort' \n
+    :param parameters: dictionary mapping species names and landscape letters to their \n
+    parameters, set on the classes of the new simulation \n
+    :return: dictionary with species as key and an array with the count of every year \n
+    """
+    sim = BioSim(island_map, ini_pop, seed=seed, engine=engine)
+    for name, params in parameters.items():
+        class_type = sim.animal_species.get(name) or sim.landscapes[name]
+        class_type.set_parameters(params)
+    counts = {species: np.zeros(num_years, dtype=np.int64) for species in sim.animal_species}
+    for year in range(num_years):
+        sim.simulate_year()
+        for species, count in sim.num_animals_per_species.items():
+            counts[species][year] = count
+    return counts
+
+
+class StreamingQuantile:
+    """
+    Estimates a quantile of a stream of arrays element by element with the P² algorithm of \n
+    Jain and Chlamtac, keeping five markers per element instead of every observation. The \n
+    first five observations are kept as they are, so the estimate is exact up to then \n
+    """
+
+    def __init__(self, probability, shape):
+        """
+        Constructor for the streaming quantile \n
+        :param probability: the quantile to estimate, between 0 and 1 \n
+        :param shape: shape of the arrays in the stream \n
+        """
+        p = probability
+        expand = (slice(None),) + (None,) * len(shape)
+        self.probability = p
+        self.count = 0
+        self.heights = np.zeros((5,) + tuple(shape))
+        self.positions = np.broadcast_to(np.arange(1., 6.)[expand], self.heights.shape).copy()
+        self.desired = np.broadcast_to(np.array([1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5.])[expand],
+                                       self.heights.shape).copy()
+        self.increments = np.array([0, p / 2, p, (1 + p) / 2, 1.])[expand]
+        self.marker = np.arange(5)[expand]
+
+    def add(self, value):
+        """
+        Adds one observation to the estimate \n
+        :param value: array with the given shape \n
+        """
+        h, n = self.heights, self.positions
+        if self.count < 5:
+            h[self.count] = value
+            self.count += 1
+            if self.count == 5:
+                h.sort(axis=0)
+            return
+        self.count += 1
+
+        h[0] = np.minimum(h[0], value)
+        h[4] = np.maximum(h[4], value)
+        cell = (value >= h[1]).astype(int) + (value >= h[2]) + (value >= h[3])
+        n += self.marker > cell
+        self.desired += self.increments
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            for i in (1, 2, 3):
+                offset = self.desired[i] - n[i]
+                move = (((offset >= 1) & (n[i + 1] - n[i] > 1)) |
+                        ((offset <= -1) & (n[i - 1] - n[i] < -1)))
+                step = np.sign(offset)
+                parabolic = h[i] + step / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i]) +
+                    (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1]))
+                neighbour = np.where(step > 0, i + 1, i - 1)
+                h_neighbour = np.take_along_axis(h, neighbour[None], axis=0)[0]
+                n_neighbour = np.take_along_axis(n, neighbour[None], axis=0)[0]
+                linear = h[i] + step * (h_neighbour - h[i]) / (n_neighbour - n[i])
+                between = (h[i - 1] < parabolic) & (parabolic < h[i + 1])
+                h[i] = np.where(move, np.where(between, parabolic, linear), h[i])
+                n[i] = np.where(move, n[i] + step, n[i])
+
+    @property
+    def value(self):
+        """
+        :return: the current estimate, NaN before the first observation \n
+        """
+        if self.count == 0:
+            return np.full(self.heights.shape[1:], np.nan)
+        if self.count < 5:
+            return np.quantile(self.heights[:self.count], self.probability, axis=0)
+        return self.heights[2].copy()
+
+
+class Ensemble:
+    """
+    Runs many replicates of the same island and population with independent random streams \n
+    and aggregates their yearly animal counts while they arrive. Only the running sums, the \n
+    extinction counts and the quantile markers are kept, never the history of a replicate. \n
+    """
+
+    def __init__(self, island_map, ini_pop, num_replicates, seed, engine="object",
+                 workers=None, quantiles=(0.05, 0.5, 0.95), parameters=None):
+        """
+        Constructor for the ensemble \n
+        :param island_map: Multi-line string specifying island geography \n
+        :param ini_pop: List of dictionaries specifying initial population \n
+        :param num_replicates: number of replicates \n
+        :param seed: seed of the ensemble. Every replicate gets its own seed spawned from it \n
+        :param engine: 'object', 'array' or 'cohort', see BioSim \n
+        :param workers: number of worker processes, None runs the replicates one by one in \n
+        this process. The aggregates do not depend on it \n
+        :param quantiles: the quantiles of the yearly counts to estimate \n
+        :param parameters: dictionary mapping species names and landscape letters to the \n
+        parameters every replicate is run with, e.g. {'Herbivore': {'beta': 0.8}}. The \n
+        other parameters keep the values the classes have when the ensemble is created \n
+        """
+        if num_replicates < 1:
+            raise ValueError('An ensemble needs at least one replicate')
+        self.island_map = island_map
+        self.ini_pop = ini_pop
+        self.num_replicates = num_replicates
+        self.seeds = np.random.SeedSequence(seed).spawn(num_replicates)
+        self.engine = engine
+        self.workers = workers
+        self.quantile_levels = tuple(quantiles)
+        self._template = BioSim(island_map, [], seed=0, engine=engine)
+        for name, params in (parameters or {}).items():
+            if name in self._template.animal_species:
+                self._template.set_animal_parameters(name, params)
+            else:
+                self._template.set_landscape_parameters(name, params)
+        self.species = list(self._template.animal_species)
+        self.num_finished = 0
+        self._sums = None
+        self._extinct = None
+        self._quantiles = None
+
+    def replicates(self, num_years):
+        """
+        Runs the replicates and yields the yearly counts of each one as soon as it is \n
+        available, in replicate order, after adding it to the aggregates \n
+        :param num_years: number of years to simulate \n
+        :return: generator of (replicate number, dictionary with species as key and an array \n
+        with the count of every year) \n
+        """
+        self.num_finished = 0
+        self._sums = {species: np.zeros(num_years) for species in self.species}
+        self._extinct = {species: np.zeros(num_years, dtype=np.int64) for species in self.species}
+        self._quantiles = {species: [StreamingQuantile(level, (num_years,))
+                                     for level in self.quantile_levels]
+                           for species in self.species}
+
+        classes = (list(self._template.animal_species.items()) +
+                   list(self._template.landscapes.items()))
+        parameters = {name: dict(class_type.parameters) for name, class_type in classes}
+        arguments = (repeat(self.island_map), repeat(self.ini_pop), self.seeds,
+                     repeat(num_years), repeat(self.engine), repeat(parameters))
+
+        if self.workers is None or self.workers <= 1:
+            for number, counts in enumerate(map(run_replicate, *arguments)):
+                self.add(counts)
+                yield number, counts
+            return
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            for number, counts in enumerate(executor.map(run_replicate, *arguments)):
+                self.add(counts)
+                yield number, counts
+
+    def add(self, counts):
+        """
+        Adds the yearly counts of one replicate to the aggregates \n
+        :param counts: dictionary with species as key and an array with the count of every year \n
+        """
+        for species in self.species:
+            self._sums[species] += counts[species]
+            self._extinct[species] += counts[species] == 0
+            for quantile in self._quantiles[species]:
+                quantile.add(counts[species])
+        self.num_finished += 1
+
+    def run(self, num_years):
+        """
+        Runs all replicates and returns the aggregates \n
+        :param num_years: number of years to simulate \n
+        :return: see summary \n
+        """
+        for _ in self.replicates(num_years):
+            pass
+        return self.summary()
+
+    def summary(self):
+        """
+        The aggregates of the replicates finished so far \n
+        :return: dictionary with species as key and a dictionary with 'mean', \n
+        'extinction_probability' and one entry per quantile level, each an array with one \n
+        value per year \n
+        """
+        if not self.num_finished:
+            raise RuntimeError('No replicate has finished yet')
+        summary = {}
+        for species in self.species:
+            summary[species] = {
+                'mean': self._sums[species] / self.num_finished,
+                'extinction_probability': self._extinct[species] / self.num_finished}
+            for level, quantile in zip(self.quantile_levels, self._quantiles[species]):
+                summary[species][level] = quantile.value
+        return summary
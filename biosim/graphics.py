@@ -6,6 +6,7 @@ __author__ = "Ashesh Raj Gnawali, Martin Bø"
 __email__ = "asgn@nmbu.no & mabo@nmbu.no"
 
 import numpy as np
+from contextlib import contextmanager
 import matplotlib.colors as mcolors
 import matplotlib.patches as mpatches
 
@@ -13,7 +14,10 @@ import matplotlib.patches as mpatches
 class Graphics:
     """
     Source: Yngve Mardal Moe, Biosim material january 2020
-    The graphics class contains everything that is needed to plot graphs from Rossumøya
+    The graphics class contains everything that is needed to plot graphs from Rossumøya.
+    Everything that changes between frames (the distributions, the curves, the histograms and
+    the year) is drawn as animated artists, so refresh only redraws those on top of a saved
+    background instead of redrawing the whole figure.
     :param map_layout: Multiline string of the island map
     :param figure: Creates a blank canvas to add subplots to
     :param map_dims: Dimensions of the map, number of rows and columns
@@ -23,6 +27,11 @@ class Graphics:
 
     map_labels = {"W": "Water", "L": "Lowland", "H": "Highland", "D": "Desert"}
 
+    species_colors = {"Herbivore": "g", "Carnivore": "r"}
+    hist_positions = {"fitness": 16, "age": 17, "weight": 18}
+    hist_titles = {"fitness": "Fitness Histogram", "age": "Age Histogram",
+                   "weight": "Weight Histogram"}
+
     def __init__(self, map_layout, figure, map_dims):
         self.map_layout = map_layout
         self.fig = figure
@@ -40,6 +49,66 @@ class Graphics:
         self.age_ax = None
         self.herbivore_image_axis = None
         self.carnivore_image_axis = None
+        self.herbivore_ydata = None
+        self.carnivore_ydata = None
+        self.histograms = {}
+        self.year_text = None
+        self._animated = []
+        self._background = None
+        self.fig.canvas.mpl_connect('resize_event', self.invalidate_background)
+
+    def animated(self, artist):
+        """
+        Marks an artist as animated, so it is left out of the background and drawn by refresh \n
+        :param artist: matplotlib artist \n
+        :return: the artist \n
+        """
+        artist.set_animated(True)
+        self._animated.append(artist)
+        self._background = None
+        return artist
+
+    def invalidate_background(self, event=None):
+        """
+        Makes the next refresh redraw the whole figure, e.g. after a resize \n
+        """
+        self._background = None
+
+    def refresh(self):
+        """
+        Draws the current frame. The static parts of the figure are only drawn the first \n
+        time and after the background has been invalidated, otherwise they are restored from \n
+        the saved background and only the animated artists are drawn and blitted \n
+        """
+        canvas = self.fig.canvas
+        if not canvas.supports_blit:
+            canvas.draw_idle()
+            canvas.flush_events()
+            return
+        if self._background is None:
+            canvas.draw()
+            self._background = canvas.copy_from_bbox(self.fig.bbox)
+        else:
+            canvas.restore_region(self._background)
+        for artist in self._animated:
+            self.fig.draw_artist(artist)
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
+
+    @contextmanager
+    def all_artists_drawn(self):
+        """
+        Context in which the animated artists are drawn like any other artist, which is \n
+        needed when the figure is saved or rendered to a movie frame \n
+        """
+        for artist in self._animated:
+            artist.set_animated(False)
+        try:
+            yield
+        finally:
+            for artist in self._animated:
+                artist.set_animated(True)
+            self._background = None
 
     def create_map(self):
         """
@@ -63,14 +132,28 @@ class Graphics:
 
         return map_array
 
-    def create_histograms_setup(self):
-
-        self.fit_ax = self.fig.add_subplot(6, 3, 16)
-        self.fit_ax.title.set_text('Fitness Histogram')
-        self.age_ax = self.fig.add_subplot(6, 3, 17)
-        self.age_ax.title.set_text('Age Histogram')
-        self.wt_ax = self.fig.add_subplot(6, 3, 18)
-        self.wt_ax.title.set_text('Weight Histogram')
+    def create_histograms_setup(self, hist_specs):
+        """
+        Creates one histogram per property in hist_specs, with fixed bins from 0 to max of \n
+        width delta and one step artist per species that is updated in place \n
+        :param hist_specs: dictionary mapping 'fitness', 'age' or 'weight' to a dictionary \n
+        with 'max' and 'delta' \n
+        """
+        axes = {}
+        for prop, specs in hist_specs.items():
+            ax = self.fig.add_subplot(6, 3, self.hist_positions[prop])
+            ax.title.set_text(self.hist_titles[prop])
+            num_bins = max(1, int(round(specs['max'] / specs['delta'])))
+            edges = np.linspace(0, num_bins * specs['delta'], num_bins + 1)
+            steps = {species: self.animated(ax.stairs(np.zeros(num_bins), edges, color=color))
+                     for species, color in self.species_colors.items()}
+            ax.set_xlim(edges[0], edges[-1])
+            ax.set_ylim(0, 1)
+            self.histograms[prop] = ax, edges, steps
+            axes[prop] = ax
+        self.fit_ax = axes.get('fitness')
+        self.age_ax = axes.get('age')
+        self.wt_ax = axes.get('weight')
 
     def create_island_graph(self):
         """
@@ -93,45 +176,46 @@ class Graphics:
         Creates a line plot for herbivores by themselves
         """
         if (self.herbivore_curve is None) or recreate:
-            plot = self.mean_ax.plot(np.arange(0, final_year), np.full(final_year, np.nan), "r")
-            self.herbivore_curve = plot[0]
+            self.herbivore_ydata = np.full(final_year, np.nan)
+            plot = self.mean_ax.plot(np.arange(0, final_year), self.herbivore_ydata, "r")
+            self.herbivore_curve = self.animated(plot[0])
 
         else:
             x_data, y_data = self.herbivore_curve.get_data()
             x_new = np.arange(x_data[-1] + 1, final_year)
             if len(x_new) > 0:
                 y_new = np.full(x_new.shape, np.nan)
-                self.herbivore_curve.set_data(np.hstack((x_data, x_new)),
-                                              np.hstack((y_data, y_new)))
+                self.herbivore_ydata = np.hstack((self.herbivore_ydata, y_new))
+                self.herbivore_curve.set_data(np.hstack((x_data, x_new)), self.herbivore_ydata)
 
     def create_carnivore_graph(self, final_year, recreate=False):
         """
         Creates a line plot for carnivores by themselves
         """
         if (self.carnivore_curve is None) or recreate:
-            plot = self.mean_ax.plot(np.arange(0, final_year), np.full(final_year, np.nan), "g")
-            self.carnivore_curve = plot[0]
+            self.carnivore_ydata = np.full(final_year, np.nan)
+            plot = self.mean_ax.plot(np.arange(0, final_year), self.carnivore_ydata, "g")
+            self.carnivore_curve = self.animated(plot[0])
         else:
             x_data, y_data = self.carnivore_curve.get_data()
             x_new = np.arange(x_data[-1] + 1, final_year)
             if len(x_new) > 0:
                 y_new = np.full(x_new.shape, np.nan)
-                self.carnivore_curve.set_data(np.hstack((x_data, x_new)),
-                                              np.hstack((y_data, y_new)))
+                self.carnivore_ydata = np.hstack((self.carnivore_ydata, y_new))
+                self.carnivore_curve.set_data(np.hstack((x_data, x_new)), self.carnivore_ydata)
 
     def update_graphs(self, year, herb_count, carn_count):
         """
         Updates graphs according to number of years and animals count
-        in subplot(3, 3, 2)
+        in subplot(3, 3, 2). Only the value of the given year is written into the y data \n
+        the curves were created with \n
         """
-        herb_ydata = self.herbivore_curve.get_ydata()
-        herb_ydata[year] = herb_count
-        self.herbivore_curve.set_ydata(herb_ydata)
+        self.herbivore_ydata[year] = herb_count
+        self.herbivore_curve.set_ydata(self.herbivore_ydata)
 
-        carn_ydata = self.carnivore_curve.get_ydata()
-        carn_ydata[year] = carn_count
-        self.carnivore_curve.set_ydata(carn_ydata)
-        self.fig.suptitle('Graphics for Year: ' + str(year), x=0.5)
+        self.carnivore_ydata[year] = carn_count
+        self.carnivore_curve.set_ydata(self.carnivore_ydata)
+        self.set_year(year)
 
     def create_animal_graphs(self, final_year, y_lim, recreate=False):
         """
@@ -155,69 +239,65 @@ class Graphics:
             self.herbivore_dist = self.fig.add_subplot(3, 3, 4)
             self.herbivore_dist.set_yticklabels([])
             self.herbivore_dist.set_xticklabels([])
-            self.herbivore_image_axis = None
+            self.herbivore_image_axis = self.distribution_image(self.herbivore_dist,
+                                                                'Herbivore Distribution')
 
         if self.carnivore_dist is None:
             self.carnivore_dist = self.fig.add_subplot(3, 3, 6)
             self.carnivore_dist.set_yticklabels([])
             self.carnivore_dist.set_xticklabels([])
-            self.carnivore_image_axis = None
+            self.carnivore_image_axis = self.distribution_image(self.carnivore_dist,
+                                                                'Carnivore Distribution')
+
+    def distribution_image(self, ax, title):
+        """
+        Creates an empty distribution image with its colorbar \n
+        :param ax: axes of the distribution \n
+        :param title: title of the axes \n
+        :return: the image artist \n
+        """
+        image = ax.imshow(np.zeros(self.map_dims), interpolation='nearest', vmin=0, vmax=100)
+        self.fig.colorbar(image, ax=ax, orientation='vertical', fraction=0.07, pad=0.04)
+        ax.set_title(title)
+        return self.animated(image)
 
     def update_herbivore_distribution(self, distribution):
         """
         Updates herbivore distribution in subplot (3, 3, 4)
         """
-        if self.herbivore_image_axis is not None:
-            self.herbivore_image_axis.set_data(distribution)
-        else:
-            self.herbivore_image_axis = self.herbivore_dist.imshow(distribution,
-                                                                   interpolation='nearest', vmin=0,
-                                                                   vmax=100)
-
-            self.herbivore_image_axis.figure.colorbar(self.herbivore_image_axis,
-                                                      ax=self.herbivore_dist,
-                                                      orientation='vertical', fraction=0.07,
-                                                      pad=0.04)
-
-            self.herbivore_dist.set_title('Herbivore Distribution')
+        self.herbivore_image_axis.set_data(distribution)
 
     def update_carnivore_distribution(self, distribution):
         """
         updates Carnivore distribution subplot (3, 3, 6)
         """
-        if self.carnivore_image_axis is not None:
-            self.carnivore_image_axis.set_data(distribution)
-        else:
-            self.carnivore_image_axis = self.carnivore_dist.imshow(distribution,
-                                                                   interpolation='nearest', vmin=0,
-                                                                   vmax=100)
-            self.carnivore_image_axis.figure.colorbar(self.carnivore_image_axis,
-                                                      ax=self.carnivore_dist,
-                                                      orientation='vertical', fraction=0.07,
-                                                      pad=0.04)
-
-            self.carnivore_dist.set_title('Carnivore Distribution')
+        self.carnivore_image_axis.set_data(distribution)
 
-    def update_histogram(self, fit_list=None, age_list=None, wt_list=None):
+    def update_histogram(self, fit_list=None, age_list=None, wt_list=None, repeats=None):
         """
         Updates the histograms in the main plot. Colors are set to green for herbivores \n
-        and red for carnivores.
-        """
-        self.fit_ax.clear()
-        self.fit_ax.title.set_text('Fitness Histogram')
-        self.fit_ax.hist(fit_list['Herbivore'], bins=20, histtype='step', color="g")
-        self.fit_ax.hist(fit_list['Carnivore'], bins=20, histtype='step', color="r")
-        self.age_ax.clear()
-        self.age_ax.title.set_text('Age Histogram')
-        self.age_ax.hist(age_list['Herbivore'], bins=20, histtype='step', color="g")
-        self.age_ax.hist(age_list['Carnivore'], bins=20, histtype='step', color="r")
-        self.wt_ax.clear()
-        self.wt_ax.title.set_text('Weight Histogram')
-        self.wt_ax.hist(wt_list['Herbivore'], bins=20, histtype='bar', color="g")
-        self.wt_ax.hist(wt_list['Carnivore'], bins=100, histtype='bar', color="r")
+        and red for carnivores. The counts are calculated with np.histogram over the fixed \n
+        bins and written into the existing step artists. The y axis only grows, and the \n
+        whole figure is only redrawn when it does. If repeats is given it maps each species \n
+        to the number of animals that share each value, which are used as histogram weights
+        """
+        values = {'fitness': fit_list, 'age': age_list, 'weight': wt_list}
+        for prop, (ax, edges, steps) in self.histograms.items():
+            highest = 0
+            for species, step in steps.items():
+                weights = None if repeats is None else repeats[species]
+                counts = np.histogram(values[prop][species], bins=edges, weights=weights)[0]
+                step.set_data(counts)
+                highest = max(highest, counts.max())
+            if highest > ax.get_ylim()[1]:
+                ax.set_ylim(0, 1.2 * highest)
+                self._background = None
 
     def set_year(self, year):
         """
         Set the year on the Figure
         """
-        self.fig.suptitle('Graphics for Year: ' + str(year), x=0.5)
+        if self.year_text is None:
+            self.year_text = self.animated(self.fig.text(0.5, 0.98, '', ha='center',
+                                                         va='top', fontsize='large'))
+        self.year_text.set_text('Graphics for Year: ' + str(year))
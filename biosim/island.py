@@ -6,33 +6,137 @@ __author__ = "Ashesh Raj Gnawali, Martin Bø"
 __email__ = "asgn@nmbu.no & mabo@nmbu.no"
 
 import numpy as np
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import repeat
+from time import perf_counter
 from biosim.landscape import Lowland, Water, Desert, Highland
 from biosim.fauna import Herbivore, Carnivore  # This is needed even though it says "unused"
 
+# The state of the population at one point in time. counts maps each species to an array with
+# the number of animals per cell, and age, weight and fitness map each species to a flat array
+# of values. If repeats is None there is one value per animal, otherwise repeats maps each
+# species to the number of animals that share each value, see per_animal.
+Snapshot = namedtuple('Snapshot', ['counts', 'age', 'weight', 'fitness', 'repeats'],
+                      defaults=[None])
+
+
+def per_animal(snapshot, attribute):
+    """
+    Collects the age, weight or fitness of a snapshot with one value per animal \n
+    :param snapshot: Snapshot of the population \n
+    :param attribute: 'weight', 'age' or 'fitness' \n
+    :return: dictionary with species as key and an array with one value per animal \n
+    """
+    values = getattr(snapshot, attribute)
+    if snapshot.repeats is None:
+        return values
+    return {species: np.repeat(values[species], snapshot.repeats[species])
+            for species in values}
+
+
+def run_cell_phases(cell, phases):
+    """
+    Runs a sequence of cell-local phases on one landscape cell. This is a module level \n
+    function so that it can be sent to worker processes. The parameters reach the workers \n
+    with the cell, since the landscape and animal classes of a simulation are pickled \n
+    together with their parameters, see parameter_class \n
+    :param cell: landscape object \n
+    :param phases: names of the Landscape methods to call in order \n
+    :return: the updated landscape object \n
+    """
+    for phase in phases:
+        getattr(cell, phase)()
+    return cell
+
+
+def run_cell_phases_timed(cell, phases):
+    """
+    Runs the phases like run_cell_phases and measures every phase \n
+    :param cell: landscape object \n
+    :param phases: names of the Landscape methods to call in order \n
+    :return: the updated landscape object and a list with (seconds, animals) per phase \n
+    """
+    timings = []
+    for phase in phases:
+        animals = sum(len(animals) for animals in cell.fauna_dict.values())
+        start = perf_counter()
+        getattr(cell, phase)()
+        timings.append((perf_counter() - start, animals))
+    return cell, timings
+
 
 class Island:
     """
     This class represents the given map string as an array of objects
     """
 
-    def __init__(self, map):
+    def __init__(self, map, rng=None, workers=None, pool="thread", debug=False, fauna=None,
+                 landscapes=None, timer=None):
         """
         Constructor for the island class
         :param map: A string which represents the island. Should only contain the letters \n
         W, L, H or D representing Water, Lowland, Highland and Desert respectively \n
+        :param rng: numpy random Generator of the island. Every land cell gets its own \n
+        Generator derived from it, so the random numbers drawn in a cell do not depend on \n
+        the order the cells are processed in. A new unseeded Generator is created if it is \n
+        not given \n
+        :param workers: number of workers used for the cell-local phases. None or 1 runs \n
+        everything in the calling thread. A process pool pickles every occupied cell with its \n
+        animals to the workers and back once per call of run_on_occupied_cells, so it is only \n
+        faster for heavy cells with many animals, see BioSim \n
+        :param pool: 'thread' or 'process', the kind of worker pool to use \n
+        :param debug: if True the population counters are checked against a full recount \n
+        after every year \n
+        :param fauna: dictionary mapping species names to the animal classes of the island, \n
+        Herbivore and Carnivore if None \n
+        :param landscapes: dictionary mapping landscape letters to the landscape classes of the \n
+        island, Water, Desert, Lowland and Highland if None \n
+        :param timer: PhaseTimer that measures every phase, None to not measure anything \n
+        """
+        if pool not in ('process', 'thread'):
+            raise ValueError("pool must be 'process' or 'thread'")
+        self.workers = workers
+        self.pool = pool
+        self._executor = None
+        self.setup_map(map, rng, debug, fauna, landscapes, timer)
+
+        self._cells = self.array_with_landscape_objects()
+        self._occupied = set()
+        self._counts = {species: np.zeros(self.map_dims, dtype=int)
+                        for species in self.fauna_dict_island}
+        self._totals = {species: 0 for species in self.fauna_dict_island}
+
+    def setup_map(self, map, rng, debug, fauna, landscapes, timer):
+        """
+        Sets up what every engine needs from the map: the landscape letters, the species and \n
+        landscape classes, the migratable mask and the neighbour index. The engines that do \n
+        not keep landscape objects call this instead of the constructor of Island \n
+        :param map: A string which represents the island, see the constructor \n
+        :param rng: numpy random Generator of the island, see the constructor \n
+        :param debug: see the constructor \n
+        :param fauna: see the constructor \n
+        :param landscapes: see the constructor \n
+        :param timer: see the constructor \n
         """
         self.map = map
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.debug = debug
+        self.timer = timer
         self.island_map = self.convert_string_to_array()
         self.check_edge_cells_is_water(self.island_map)
 
-        self.landscape_dict = {'W': Water, 'D': Desert, 'L': Lowland, 'H': Highland}
-        self.fauna_dict_island = {'Herbivore': Herbivore, 'Carnivore': Carnivore}
-
-        self._cells = self.array_with_landscape_objects()
+        if landscapes is None:
+            landscapes = {'W': Water, 'D': Desert, 'L': Lowland, 'H': Highland}
+        if fauna is None:
+            fauna = {'Herbivore': Herbivore, 'Carnivore': Carnivore}
+        self.landscape_dict = landscapes
+        self.fauna_dict_island = fauna
 
-        rows = self._cells.shape[0]
-        cols = self._cells.shape[1]
-        self.map_dims = rows, cols
+        self.map_dims = self.island_map.shape
+        self.migratable = np.array([self.landscape_dict[letter].is_migratable
+                                    for letter in self.island_map.flat], dtype=bool)
+        self.neighbour_ptr, self.neighbour_ids = self.neighbour_index()
 
     @property
     def cells(self):
@@ -42,6 +146,16 @@ class Island:
         """
         return self._cells
 
+    @property
+    def occupied_cells(self):
+        """
+        The land cells that currently hold animals, in row-major order. The set is updated \n
+        when animals are added, migrate or die, so the yearly work and the statistics only \n
+        depend on the occupied area and not on the size of the map \n
+        :return: list of (row, col) tuples \n
+        """
+        return sorted(self._occupied)
+
     def convert_string_to_array(self):
         """
         Converts a multidimensional string to a numpy array from \n
@@ -77,16 +191,42 @@ class Island:
     def array_with_landscape_objects(self):
         """
         Creates an array similar to the map with the same dimensions, but with the landscape \n
-        objects corresponding to the landscape letter instead of a string \n
+        objects corresponding to the landscape letter instead of a string. Every land cell \n
+        gets a SeedSequence with its cell index as spawn key below the seed sequence of the \n
+        island, which is the stream rng.spawn would give it. The Generator is only created \n
+        when the cell first draws a random number, and water cells get none \n
         :return: an array with the landscape objects \n
         """
         landscape_cell_object = np.empty(self.island_map.shape, dtype=object)
-        for row in np.arange(self.island_map.shape[0]):
-            for col in np.arange(self.island_map.shape[1]):
-                landscape_type = self.island_map[row][col]
-                landscape_cell_object[row][col] = self.landscape_dict[landscape_type]()
+        seed_seq = self.rng.bit_generator.seed_seq
+        for cell_id, landscape_type in enumerate(self.island_map.flat):
+            landscape_class = self.landscape_dict[landscape_type]
+            cell_seed = None
+            if landscape_class.is_migratable:
+                cell_seed = np.random.SeedSequence(seed_seq.entropy,
+                                                   spawn_key=seed_seq.spawn_key + (cell_id,),
+                                                   pool_size=seed_seq.pool_size)
+            landscape_cell_object.flat[cell_id] = landscape_class(rng=cell_seed)
         return landscape_cell_object
 
+    def neighbour_index(self):
+        """
+        Builds the neighbour index of the map in compressed sparse row form. Cells are \n
+        numbered row by row, and the neighbours of cell k are \n
+        neighbour_ids[neighbour_ptr[k]:neighbour_ptr[k + 1]], in the order up, down, left, \n
+        right, leaving out neighbours outside the map \n
+        :return: the neighbour_ptr and neighbour_ids arrays \n
+        """
+        rows, cols = self.island_map.shape
+        row, col = np.divmod(np.arange(rows * cols), cols)
+        neighbour_rows = np.stack([row - 1, row + 1, row, row], axis=1)
+        neighbour_cols = np.stack([col, col, col - 1, col + 1], axis=1)
+        inside = ((neighbour_rows >= 0) & (neighbour_rows < rows) &
+                  (neighbour_cols >= 0) & (neighbour_cols < cols))
+        neighbour_ids = (neighbour_rows * cols + neighbour_cols)[inside]
+        neighbour_ptr = np.concatenate([[0], np.cumsum(inside.sum(axis=1))])
+        return neighbour_ptr, neighbour_ids
+
     def adjacent_cells(self, n_rows, n_cols):
         """
         Finds the immediate adjacent cells of a cell \n
@@ -94,44 +234,128 @@ class Island:
         :param n_cols: The column number \n
         :return: A list with the adjacent cells \n
         """
-        rows, cols = self.map_dims
-        adjacent_cell_list = []
-        if n_rows > 0:
-            adjacent_cell_list.append(self._cells[n_rows - 1, n_cols])
-        if n_rows + 1 < rows:
-            adjacent_cell_list.append(self._cells[n_rows + 1, n_cols])
-        if n_cols > 0:
-            adjacent_cell_list.append(self._cells[n_rows, n_cols - 1])
-        if n_cols + 1 < cols:
-            adjacent_cell_list.append(self._cells[n_rows, n_cols + 1])
-        return adjacent_cell_list
+        cell_id = n_rows * self.map_dims[1] + n_cols
+        neighbours = self.neighbour_ids[self.neighbour_ptr[cell_id]:self.neighbour_ptr[cell_id + 1]]
+        return [self._cells.flat[neighbour] for neighbour in neighbours]
 
     def life_cycle_in_rossumoya(self):
         """
-        Iterates through all the cells and performs life cycle events. This should be called \n
-        every year \n
+        Performs the life cycle events on all cells, one phase at a time. Feeding, birth and \n
+        the migration decisions run for every cell first, then all migrating animals are \n
+        moved at once, and finally all animals age and die. Only occupied cells are visited, \n
+        and the cell-local phases are run in parallel if workers is larger than one. This \n
+        should be called every year \n
         """
-        self.reset_migration_bool_in_all_cells()
-        rows, cols = self.map_dims
+        self.run_on_occupied_cells(("update_fodder", "animal_eats", "animal_gives_birth",
+                                    "decide_migration"))
+        self.run_phase("apply_migration")
+        self.run_on_occupied_cells(("animal_ages_and_dies",))
+        self._occupied = {loc for loc in self._occupied
+                          if any(self._cells[loc].fauna_dict.values())}
+        if self.debug:
+            self.check_counters()
 
-        for row in range(rows):
-            for col in range(cols):
-                if self._cells[row, col].is_migratable:
-                    self._cells[row, col].update_fodder()
-                    self._cells[row, col].animal_eats()
-                    self._cells[row, col].animal_gives_birth()
-                    self._cells[row, col].migration(self.adjacent_cells(row, col))
-                    self._cells[row, col].update_animal_weight_and_age()
-                    self._cells[row, col].animal_dies()
+    def run_phase(self, phase):
+        """
+        Runs a phase that works on the whole island at once, measured by the timer if there \n
+        is one \n
+        :param phase: name of the Island method to call \n
+        """
+        if self.timer is None:
+            getattr(self, phase)()
+            return
+        animals = sum(self.number_of_animals_per_species(species)
+                      for species in self.fauna_dict_island)
+        with self.timer.measure(phase, 'Island', animals):
+            getattr(self, phase)()
 
-    def reset_migration_bool_in_all_cells(self):
+    def apply_migration(self):
         """
-        Iterates through the landscape cells and resets the migration boolean \n
+        Moves the animals that decided to migrate in every occupied cell to their new cells, \n
+        using the neighbour index and the migratable mask. All decisions are made before any \n
+        animal moves, so no animal can move twice in a year and the result does not depend on \n
+        the order of the cells \n
         """
-        rows, cols = self.map_dims
-        for row in range(rows):
-            for col in range(cols):
-                self._cells[row, col].reset_migration_bool_in_cell()
+        cols = self.map_dims[1]
+        for row, col in self.occupied_cells:
+            cell = self._cells[row, col]
+            if not cell.emigrants:
+                continue
+            first_neighbour = self.neighbour_ptr[row * cols + col]
+            directions = np.fromiter((direction for _, direction in cell.emigrants), int,
+                                     len(cell.emigrants))
+            targets = self.neighbour_ids[first_neighbour + directions]
+            for (animal, _), target, can_move in zip(cell.emigrants, targets.tolist(),
+                                                     self.migratable[targets].tolist()):
+                loc = divmod(target, cols) if can_move else (row, col)
+                self._cells[loc].add_animal(animal)
+                self._occupied.add(loc)
+                species = animal.__class__.__name__
+                self._counts[species][loc] += 1
+                self._totals[species] += 1
+            cell.emigrants = []
+
+    def run_on_occupied_cells(self, phases):
+        """
+        Runs cell-local phases on every occupied cell, either in this thread or in the worker \n
+        pool, and updates the population counters with the births, deaths, kills and \n
+        emigrations of each cell \n
+        :param phases: names of the Landscape methods to call in order \n
+        """
+        locations = self.occupied_cells
+        cells = [self._cells[loc] for loc in locations]
+        run_phases = run_cell_phases if self.timer is None else run_cell_phases_timed
+        if self.workers is None or self.workers <= 1:
+            updated_cells = map(run_phases, cells, repeat(phases))
+        else:
+            if self._executor is None:
+                executor_type = (ProcessPoolExecutor if self.pool == "process"
+                                 else ThreadPoolExecutor)
+                self._executor = executor_type(max_workers=self.workers)
+            chunksize = max(1, len(cells) // (4 * self.workers))
+            updated_cells = self._executor.map(run_phases, cells, repeat(phases),
+                                               chunksize=chunksize)
+        for loc, cell in zip(locations, updated_cells):
+            if self.timer is not None:
+                cell, timings = cell
+                self.timer.record_phases(type(cell).__name__, phases, timings)
+            self._cells[loc] = cell
+        self.update_counters(locations)
+
+    def update_counters(self, locations):
+        """
+        Updates the per-cell and island-wide population counters of the given cells after \n
+        the animals in them have changed \n
+        :param locations: list of (row, col) tuples \n
+        """
+        for loc in locations:
+            for species, animals in self._cells[loc].fauna_dict.items():
+                change = len(animals) - self._counts[species][loc]
+                if change:
+                    self._counts[species][loc] += change
+                    self._totals[species] += change
+
+    def check_counters(self):
+        """
+        Compares the population counters with a full recount of every cell. Raises \n
+        RuntimeError if they differ \n
+        """
+        for species in self.fauna_dict_island:
+            recount = np.zeros(self.map_dims, dtype=int)
+            for loc, cell in np.ndenumerate(self._cells):
+                recount[loc] = len(cell.fauna_dict[species]) + sum(
+                    animal.__class__.__name__ == species for animal, _ in cell.emigrants)
+            if not np.array_equal(recount, self._counts[species]) or \
+                    recount.sum() != self._totals[species]:
+                raise RuntimeError('The ' + species + ' counters do not match the recount')
+
+    def close(self):
+        """
+        Shuts down the worker pool, if one has been started \n
+        """
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
 
     def add_animals(self, population):
         """
@@ -154,17 +378,112 @@ class Island:
                     animal_obj = species_class(age=age, weight=weight)
                     cell = self._cells[loc]
                     cell.add_animal(animal_obj)
+                    self._counts[species][loc] += 1
+                    self._totals[species] += 1
+                if animals:
+                    self._occupied.add(loc)
+
+    def get_state(self):
+        """
+        Collects the full state of the island for a checkpoint: the animals of every cell in \n
+        their current order, the fitness caches, the fodder and the random generator states \n
+        of the island and of every land cell \n
+        :return: dictionary of arrays and dictionary of JSON serialisable values \n
+        """
+        cells = list(self._cells.flat)
+        arrays = {'food_left': np.array([cell.food_left for cell in cells], dtype=float)}
+        for species in self.fauna_dict_island:
+            animals = [animal for cell in cells for animal in cell.fauna_dict[species]]
+            arrays[species + '_count'] = np.array([len(cell.fauna_dict[species])
+                                                   for cell in cells], dtype=np.int64)
+            arrays[species + '_age'] = np.array([animal.age for animal in animals])
+            arrays[species + '_weight'] = np.array([animal.weight for animal in animals],
+                                                   dtype=float)
+            arrays[species + '_fitness'] = np.array(
+                [np.nan if animal.fitness is None else animal.fitness for animal in animals],
+                dtype=float)
+        state = {'rng': self.rng.bit_generator.state,
+                 'cell_rngs': [cell.rng.bit_generator.state
+                               for cell in self._cells.flat[self.migratable]]}
+        return arrays, state
+
+    def set_state(self, arrays, state):
+        """
+        Restores a state collected by get_state on an island with the same map \n
+        :param arrays: dictionary of arrays from get_state \n
+        :param state: dictionary of values from get_state \n
+        """
+        cells = list(self._cells.flat)
+        self.rng.bit_generator.state = state['rng']
+        for cell, cell_rng in zip(self._cells.flat[self.migratable], state['cell_rngs']):
+            cell.rng.bit_generator.state = cell_rng
+        for cell, food_left in zip(cells, arrays['food_left'].tolist()):
+            cell.food_left = food_left
+            cell.emigrants = []
+            cell.fauna_dict = {species: [] for species in self.fauna_dict_island}
+
+        for species, species_class in self.fauna_dict_island.items():
+            animals = iter(zip(arrays[species + '_age'].tolist(),
+                               arrays[species + '_weight'].tolist(),
+                               arrays[species + '_fitness'].tolist()))
+            for cell, count in zip(cells, arrays[species + '_count'].tolist()):
+                for age, weight, fitness in (next(animals) for _ in range(count)):
+                    animal = species_class(age=age, weight=weight)
+                    animal.fitness = None if np.isnan(fitness) else fitness
+                    cell.fauna_dict[species].append(animal)
+
+        self._occupied = {loc for loc, cell in np.ndenumerate(self._cells)
+                          if any(cell.fauna_dict.values())}
+        for counts in self._counts.values():
+            counts[:] = 0
+        self._totals = dict.fromkeys(self._totals, 0)
+        self.update_counters(self.occupied_cells)
 
     def number_of_animals_per_species(self, species):
         """
-        Calculates the total amount of animals per species on the island \n
-        :param species: dictionary with the animal classes \n
+        The total amount of animals per species on the island, read from the population \n
+        counters \n
+        :param species: name of the species \n
         :return: The total number of animals on the island \n
         """
-        num_animals = 0
-        rows, cols = self.map_dims
-        for row in range(rows):
-            for col in range(cols):
-                cell = self._cells[row, col]
-                num_animals += len(cell.fauna_dict[species])
-        return num_animals
+        return self._totals[species]
+
+    def count_map(self, species):
+        """
+        Counts the animals of a species in every cell, read from the population counters \n
+        :param species: name of the species \n
+        :return: array with the same shape as the map with the animal count per cell \n
+        """
+        return self._counts[species].copy()
+
+    def animal_values(self, attribute):
+        """
+        Collects the weight, age or fitness of every animal per species. The island does not \n
+        cache the snapshot, since the phases can be called on it directly, BioSim keeps one \n
+        snapshot per year instead \n
+        :param attribute: 'weight', 'age' or 'fitness' \n
+        :return: dictionary with species as key and an array of values \n
+        """
+        return per_animal(self.snapshot(), attribute)
+
+    def snapshot(self):
+        """
+        Collects the animal count per cell from the population counters, and the age, weight \n
+        and fitness of every animal straight from the occupied cells into arrays sized by the \n
+        population totals, without collecting the animals in lists first. The fitness is \n
+        evaluated once per species with Fauna.fitness_array \n
+        :return: Snapshot of the population \n
+        """
+        counts = {species: self.count_map(species) for species in self.fauna_dict_island}
+        occupied = [self._cells[loc].fauna_dict for loc in self.occupied_cells]
+        age, weight = {}, {}
+        for species in self.fauna_dict_island:
+            num_animals = self._totals[species]
+            age[species] = np.fromiter((animal.age for fauna in occupied
+                                        for animal in fauna[species]), float, num_animals)
+            weight[species] = np.fromiter((animal.weight for fauna in occupied
+                                           for animal in fauna[species]), float, num_animals)
+
+        fitness = {species: species_class.fitness_array(age[species], weight[species])
+                   for species, species_class in self.fauna_dict_island.items()}
+        return Snapshot(counts, age, weight, fitness)
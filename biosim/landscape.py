@@ -7,23 +7,44 @@ __email__ = "asgn@nmbu.no & mabo@nmbu.no"
 
 import numpy as np
 import operator
+from itertools import compress
 from biosim.fauna import Herbivore, Carnivore
+from biosim.parameters import ParameterClass
 # This is needed even though it says "unused"
 
 
-class Landscape:
+class Landscape(metaclass=ParameterClass):
     """
     Parent class for the landscapes classes water, desert, highland and lowland \n
     """
 
     parameters = {}
 
-    def __init__(self):
+    def __init__(self, rng=None):
         """
-        Constructor for the Landscape class
+        Constructor for the Landscape class \n
+        :param rng: numpy random Generator used for all random decisions in the cell, or a \n
+        SeedSequence to create it from when the cell first draws a random number. A new \n
+        unseeded Generator is created on first use if it is not given \n
         """
         self.fauna_dict = {"Herbivore": [], "Carnivore": []}
+        self.emigrants = []
         self.food_left = 0
+        self._rng = rng
+
+    @property
+    def rng(self):
+        """
+        The random Generator of the cell, created on first use \n
+        :return: numpy random Generator \n
+        """
+        if self._rng is None or isinstance(self._rng, np.random.SeedSequence):
+            self._rng = np.random.default_rng(self._rng)
+        return self._rng
+
+    @rng.setter
+    def rng(self, rng):
+        self._rng = rng
 
     def add_animal(self, animal):
         """
@@ -33,11 +54,38 @@ class Landscape:
         species = animal.__class__.__name__
         self.fauna_dict[species].append(animal)
 
+    def animal_arrays(self, species):
+        """
+        Collects the ages and weights of all animals of a species in the cell \n
+        :param species: name of the species \n
+        :return: array with ages and array with weights \n
+        """
+        animals = self.fauna_dict[species]
+        ages = np.fromiter((animal.age for animal in animals), float, len(animals))
+        weights = np.fromiter((animal.weight for animal in animals), float, len(animals))
+        return ages, weights
+
+    def update_fitness(self):
+        """
+        Fills the fitness cache of the animals in the cell whose age or weight changed since \n
+        their fitness was last calculated. The fitness of those animals is calculated with \n
+        one vectorized evaluation per species, and animals with a valid cache are skipped \n
+        """
+        for animals in self.fauna_dict.values():
+            stale = [animal for animal in animals if animal.fitness is None]
+            if stale:
+                ages = np.fromiter((animal.age for animal in stale), float, len(stale))
+                weights = np.fromiter((animal.weight for animal in stale), float, len(stale))
+                fitness = stale[0].fitness_array(ages, weights)
+                for animal, animal_fitness in zip(stale, fitness.tolist()):
+                    animal.fitness = animal_fitness
+
     def sort_by_fitness(self):
         """
         Sorts the animal by their fitness. Herbivores are sorted from low to high while the \n
         carnivores are sorted from high to low \n
         """
+        self.update_fitness()
         self.fauna_dict["Herbivore"].sort(key=operator.attrgetter("animal_fitness"))
         self.fauna_dict["Carnivore"].sort(key=operator.attrgetter("animal_fitness"), reverse=True)
 
@@ -63,14 +111,18 @@ class Landscape:
         fodder as 0. \n
         """
         self.food_left = self.parameters["f_max"]
-        np.random.shuffle(self.fauna_dict["Herbivore"])
-        for herb in self.fauna_dict["Herbivore"]:
+        herbivores = self.fauna_dict["Herbivore"]
+        self.rng.shuffle(herbivores)
+        if not herbivores:
+            return
+        appetite = herbivores[0].params.F
+        for herb in herbivores:
             if self.food_left <= 0:
                 break
-            elif self.food_left >= herb.parameters['F']:
-                herb.animal_weight_with_food(herb.parameters['F'])
-                self.food_left -= herb.parameters['F']
-            elif 0 < self.food_left < herb.parameters["F"]:
+            elif self.food_left >= appetite:
+                herb.animal_weight_with_food(appetite)
+                self.food_left -= appetite
+            elif 0 < self.food_left < appetite:
                 herb.animal_weight_with_food(self.food_left)
                 self.food_left = 0
 
@@ -79,23 +131,28 @@ class Landscape:
         The carnivores eat in the order of fitness. The carnivore with the highest fitness \n
         eats first and preys on the herbivore with the lowest fitness. If the herbivore is \n
         heavy enough or a carnivore to eat, it eats according to it's appetite, \n
-        else it eats the food according to the weight of the herbivore \n
-        """
-        self.sort_by_fitness()
-        for carnivore in self.fauna_dict["Carnivore"]:
-            appetite_of_carnivore = carnivore.parameters["F"]
-            food_eaten = 0
-            dead_animals = []
-            for herb in self.fauna_dict["Herbivore"]:
-
-                if np.random.uniform(0, 1) < carnivore.probability_of_killing(herb):
-                    if food_eaten < appetite_of_carnivore:
-                        eaten = min(carnivore.parameters['F'] - food_eaten, herb.weight)
-                        carnivore.animal_weight_with_food(eaten)
-                        dead_animals.append(herb)
-                        food_eaten += eaten
-            self.fauna_dict['Herbivore'] = [herbivore for herbivore in self.fauna_dict['Herbivore']
-                                            if herbivore not in dead_animals]
+        else it eats the food according to the weight of the herbivore. The hunt itself is \n
+        done on arrays by Carnivore.hunt, and the killed herbivores are removed with a mask \n
+        """
+        herbivores = self.fauna_dict["Herbivore"]
+        carnivores = self.fauna_dict["Carnivore"]
+        if not herbivores or not carnivores:
+            return
+
+        self.update_fitness()
+        carn_ages, carn_weights = self.animal_arrays("Carnivore")
+        herb_fitness = np.fromiter((herb.fitness for herb in herbivores), float,
+                                   len(herbivores))
+        herb_weights = np.fromiter((herb.weight for herb in herbivores), float,
+                                   len(herbivores))
+        food_eaten, killed = carnivores[0].hunt(carn_ages, carn_weights, herb_fitness,
+                                                herb_weights, self.rng)
+
+        for carnivore, eaten in zip(carnivores, food_eaten.tolist()):
+            if eaten > 0:
+                carnivore.animal_weight_with_food(eaten)
+        self.fauna_dict["Herbivore"] = [herbivore for herbivore, dead in
+                                        zip(herbivores, killed.tolist()) if not dead]
 
     def update_animal_weight_and_age(self):
         """
@@ -107,22 +164,70 @@ class Landscape:
 
     def animal_gives_birth(self):
         """
-        Compares the birth_probability of an animal with the randomly generated value between \n
-        0 and 1 and if it's greater, the animal gives birth. Creates the child of the same \n
-        species and decreases the weight of the animal \n
+        Every animal with enough weight gives birth with probability \n
+        min(1, gamma * fitness * (N - 1)), see Fauna.probability_of_birth. The probabilities, \n
+        the uniform draws, the child weights and the weight check of \n
+        Fauna.weight_update_after_birth are computed for all animals of a species at once, \n
+        so only the mothers get their weight updated and only the children that are really \n
+        born are created \n
+        """
+        for species, animals in self.fauna_dict.items():
+            num_animals = len(animals)
+            if num_animals < 2:
+                continue
+            species_type = animals[0].__class__
+            params = species_type.params
+            ages, weights = self.animal_arrays(species)
+            birth_proba = np.minimum(1, params.gamma * species_type.fitness_array(ages, weights)
+                                     * (num_animals - 1))
+            weight_check = params.zeta * (params.w_birth + params.sigma_birth)
+            mothers = np.flatnonzero((weights > weight_check) &
+                                     (self.rng.random(num_animals) < birth_proba))
+            if len(mothers) == 0:
+                continue
+
+            child_weights = self.rng.normal(params.w_birth, params.sigma_birth, len(mothers))
+            heavy_enough = weights[mothers] > params.xi * child_weights
+            mothers, child_weights = mothers[heavy_enough], child_weights[heavy_enough]
+            mother_weights = weights[mothers] - params.xi * child_weights
+            for mother, weight in zip(mothers.tolist(), mother_weights.tolist()):
+                animals[mother].weight = weight
+            animals.extend([species_type(0, weight) for weight in child_weights.tolist()])
+
+    def decide_migration(self, num_neighbours=4):
+        """
+        Decides which animals leave the cell this year and in which direction. An animal \n
+        moves with probability mu * fitness to one of the adjacent cells with equal \n
+        probability. The animals that move are taken out of the cell and kept in emigrants \n
+        together with the index of the chosen neighbour until apply_migration is called. \n
+        :param num_neighbours: number of adjacent cells \n
         """
+        self.emigrants = []
         for species, animals in self.fauna_dict.items():
-            newborns = []
-            for animal in animals:
-                if animal.proba_animal_birth(len(animals)):
-                    child_species = animal.__class__
-                    child = child_species()
-                    animal.weight_update_after_birth(child)
-
-                    if animal.gives_birth:
-                        newborns.append(child)
-                        animal.gives_birth = False
-            self.fauna_dict[species].extend(newborns)
+            if not animals:
+                continue
+            species_type = animals[0].__class__
+            move_probability = species_type.params.mu * species_type.fitness_array(
+                *self.animal_arrays(species))
+            moves = (self.rng.random(len(animals)) < move_probability).tolist()
+            directions = self.rng.integers(num_neighbours, size=sum(moves))
+            self.emigrants.extend(zip(compress(animals, moves), directions.tolist()))
+            self.fauna_dict[species] = [animal for animal, move in zip(animals, moves)
+                                        if not move]
+
+    def apply_migration(self, adj_cells):
+        """
+        Moves the emigrants to the chosen adjacent cells. Animals that chose a cell they \n
+        cannot migrate to stay in this cell. \n
+        :param adj_cells: list of adjacent cells, in the order used by decide_migration \n
+        """
+        for animal, direction in self.emigrants:
+            cell_to_migrate = adj_cells[direction]
+            if cell_to_migrate.is_migratable:
+                cell_to_migrate.add_animal(animal)
+            else:
+                self.add_animal(animal)
+        self.emigrants = []
 
     def migration(self, adj_cells):
         """
@@ -130,43 +235,44 @@ class Landscape:
         is added to the new cell and remove from the old cell. \n
         :param adj_cells: list of adjacent cells that animal can move to \n
         """
-
-        for species, animals in self.fauna_dict.items():
-            animals_that_migrated = []
-            for animal in animals:
-                if animal.has_animal_already_moved is False:
-                    if animal.animal_moves_bool:
-                        cell_to_migrate = np.random.choice(adj_cells)
-                        if cell_to_migrate.is_migratable:
-                            cell_to_migrate.add_animal(animal)
-                            animal.has_animal_already_moved = True
-                            animals_that_migrated.append(animal)
-
-            self.fauna_dict[species] = [animal for animal in self.fauna_dict[species] if
-                                        animal not in animals_that_migrated]
-
-    def reset_migration_bool_in_cell(self):
-        """
-        Resets the boolean if an animal has moved or not during a year. Ensures that the animal \n
-        migrates maximum once per year. \n
-        :return: Boolean \n
-        """
-        for species, animals in self.fauna_dict.items():
-            for animal in animals:
-                animal.has_animal_already_moved = False
+        self.decide_migration(len(adj_cells))
+        self.apply_migration(adj_cells)
 
     def animal_dies(self):
         """"
-        If the generated random number is greater than the probability of death, we remove \n
+        If the generated random number is smaller than the probability of death, we remove \n
         the animal from the dictionary \n
         """
+        self.update_fitness()
+        for species, animals in self.fauna_dict.items():
+            draws = self.rng.random(len(animals))
+            self.fauna_dict[species] = [animal for animal, draw in zip(animals, draws.tolist())
+                                        if draw >= animal.probability_of_death]
+
+    def animal_ages_and_dies(self):
+        """
+        Runs update_animal_weight_and_age and animal_dies in one pass over the age and \n
+        weight arrays of each species: the animals age by 1 and lose weight by a factor of \n
+        eta, the fitness is computed once from the new values, the deaths are drawn as one \n
+        batch and only the survivors are kept and updated. The random numbers are drawn just \n
+        like in animal_dies, so the result is the same as calling the two phases \n
+        """
         for species, animals in self.fauna_dict.items():
-            dead_animals = []
-            for animal in animals:
-                if animal.death_probability:
-                    dead_animals.append(animal)
-            self.fauna_dict[species] = [animal for animal in self.fauna_dict[species] if
-                                        animal not in dead_animals]
+            if not animals:
+                continue
+            species_type = animals[0].__class__
+            params = species_type.params
+            ages, weights = self.animal_arrays(species)
+            ages = ages.astype(np.int64) + 1
+            weights -= params.eta * weights
+            fitness = species_type.fitness_array(ages, weights)
+            dies = (fitness <= 0) | (self.rng.random(len(animals)) <
+                                     params.omega * (1 - fitness))
+            survivors = np.flatnonzero(~dies)
+            kept = [animals[index] for index in survivors.tolist()]
+            species_type.store_arrays(kept, ages[survivors].tolist(),
+                                      weights[survivors].tolist(), fitness[survivors].tolist())
+            self.fauna_dict[species] = kept
 
     @property
     def cell_fauna_count(self):
@@ -195,8 +301,8 @@ class Water(Landscape):
     """
     is_migratable = False
 
-    def __init__(self):
-        super().__init__()
+    def __init__(self, rng=None):
+        super().__init__(rng)
 
     def update_fodder(self):
         pass
@@ -212,8 +318,8 @@ class Desert(Landscape):
 
     parameters = {'f_max': 0}
 
-    def __init__(self, given_params=None):
-        super().__init__()
+    def __init__(self, given_params=None, rng=None):
+        super().__init__(rng)
         if given_params is not None:
             self.set_parameters(given_params)
         self.food_left = self.parameters['f_max']
@@ -232,8 +338,8 @@ class Highland(Landscape):
 
     parameters = {'f_max': 300}
 
-    def __init__(self, given_params=None):
-        super().__init__()
+    def __init__(self, given_params=None, rng=None):
+        super().__init__(rng)
         if given_params is not None:
             self.set_parameters(given_params)
         self.food_left = self.parameters['f_max']
@@ -256,8 +362,8 @@ class Lowland(Landscape):
 
     parameters = {'f_max': 800}
 
-    def __init__(self, given_params=None):
-        super().__init__()
+    def __init__(self, given_params=None, rng=None):
+        super().__init__(rng)
         if given_params is not None:
             self.set_parameters(given_params)
 
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+
+"""
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import subprocess
+
+import numpy as np
+
+FFMPEG_BINARY = 'ffmpeg'
+
+
+class MovieWriter:
+    """
+    Streams the frames of a matplotlib figure straight into an ffmpeg process. Each frame is \n
+    rendered to a raw RGB buffer and written to the stdin of ffmpeg, so no image files are \n
+    written or read. ffmpeg is started when the first frame arrives, since the frame size is \n
+    only known then, and the movie is finished by close. \n
+    """
+
+    def __init__(self, file_name, fps=10, binary=None):
+        """
+        Constructor for the movie writer \n
+        :param file_name: name of the movie file, including the path \n
+        :param fps: frames per second of the movie \n
+        :param binary: the ffmpeg executable, FFMPEG_BINARY if None \n
+        """
+        self.file_name = file_name
+        self.fps = fps
+        self.binary = FFMPEG_BINARY if binary is None else binary
+        self.frame_size = None
+        self.num_frames = 0
+        self._process = None
+
+    def command(self, width, height):
+        """
+        The ffmpeg command line for frames of the given size \n
+        :param width: frame width in pixels \n
+        :param height: frame height in pixels \n
+        :return: list of arguments \n
+        """
+        return [self.binary, '-y', '-loglevel', 'error',
+                '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', '{}x{}'.format(width, height),
+                '-r', str(self.fps), '-i', '-', '-an',
+                '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-vcodec', 'libx264',
+                '-pix_fmt', 'yuv420p', self.file_name]
+
+    def write_frame(self, figure):
+        """
+        Renders the figure and sends the frame to ffmpeg \n
+        :param figure: matplotlib figure \n
+        """
+        figure.canvas.draw()
+        frame = np.asarray(figure.canvas.buffer_rgba())[:, :, :3]
+        height, width = frame.shape[:2]
+        if self._process is None:
+            self.frame_size = width, height
+            self._process = subprocess.Popen(self.command(width, height),
+                                             stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+        elif (width, height) != self.frame_size:
+            raise ValueError('The figure size changed while writing the movie')
+        try:
+            self._process.stdin.write(np.ascontiguousarray(frame).tobytes())
+        except BrokenPipeError:
+            self.close()
+            raise RuntimeError('Error: ffmpeg stopped reading frames')
+        self.num_frames += 1
+
+    def close(self):
+        """
+        Finishes the movie and waits for ffmpeg to exit. Raises RuntimeError if ffmpeg failed \n
+        """
+        if self._process is None:
+            return
+        process, self._process = self._process, None
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        error = process.stderr.read()
+        process.stderr.close()
+        if process.wait() != 0:
+            raise RuntimeError('Error: ffmpeg failed with: {}'.format(
+                error.decode(errors='replace')))
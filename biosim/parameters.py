@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import copyreg
+import uuid
+import weakref
+
+
+class ParameterClass(type):
+    """
+    Metaclass of the Fauna and Landscape classes. It lets a simulation work on its own \n
+    subclass of every species and landscape type, made by parameter_class, so that setting \n
+    parameters in one simulation does not change any other simulation in the process \n
+    """
+
+
+_parameter_classes = weakref.WeakValueDictionary()
+
+
+def parameter_class(base, parameters=None, key=None):
+    """
+    Creates a subclass of a species or landscape class with its own copy of the parameters. \n
+    The subclass keeps the name of the base class, so it is used exactly like it \n
+    :param base: Fauna or Landscape subclass \n
+    :param parameters: parameters that replace the copied values of base \n
+    :param key: identifies the subclass when it is unpickled. Unpickling with a key that is \n
+    already known in the process gives the existing class with the parameters updated \n
+    :return: the new subclass \n
+    """
+    if key is not None and key in _parameter_classes:
+        cls = _parameter_classes[key]
+    else:
+        key = uuid.uuid4().hex if key is None else key
+        namespace = {'parameters': dict(base.parameters), '_parameter_key': key,
+                     '__module__': base.__module__, '__qualname__': base.__qualname__}
+        if '__slots__' in base.__dict__:
+            namespace['__slots__'] = ()
+        cls = ParameterClass(base.__name__, (base,), namespace)
+        _parameter_classes[key] = cls
+    if parameters:
+        cls.set_parameters(parameters)
+    return cls
+
+
+def _reduce_parameter_class(cls):
+    """
+    Pickles the subclasses made by parameter_class by value, together with their current \n
+    parameters, so they can be sent to worker processes. Other classes are pickled by name \n
+    """
+    key = cls.__dict__.get('_parameter_key')
+    if key is None:
+        return cls.__qualname__
+    return parameter_class, (cls.__base__, dict(cls.parameters), key)
+
+
+copyreg.pickle(ParameterClass, _reduce_parameter_class)
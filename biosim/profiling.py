@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+from contextlib import contextmanager
+from time import perf_counter
+
+import numpy as np
+
+# Row type of the per-year timings handed to the results sink
+TIMING_DTYPE = np.dtype([('phase', 'U32'), ('landscape', 'U16'), ('time', float),
+                         ('calls', np.int64), ('animals', np.int64)])
+
+
+class PhaseTimer:
+    """
+    Accumulates the wall time, the number of calls and the number of animals processed for \n
+    every phase of the yearly cycle and every landscape type. Phases that run on the whole \n
+    island at once, like the migration of the object engine and every phase of the array \n
+    engine, are recorded with the landscape 'Island'. An island only measures its phases \n
+    when a timer is attached, so there is no cost when timing is off. \n
+    """
+
+    def __init__(self):
+        self._totals = {}
+        self._year = {}
+
+    def record(self, phase, landscape, seconds, animals):
+        """
+        Adds one call of a phase \n
+        :param phase: name of the phase \n
+        :param landscape: name of the landscape type, or 'Island' \n
+        :param seconds: wall time of the call \n
+        :param animals: number of animals when the phase started \n
+        """
+        entry = self._year.get((phase, landscape))
+        if entry is None:
+            entry = self._year[phase, landscape] = [0., 0, 0]
+        entry[0] += seconds
+        entry[1] += 1
+        entry[2] += animals
+
+    def record_phases(self, landscape, phases, timings):
+        """
+        Adds the phases run on one cell \n
+        :param landscape: name of the landscape type of the cell \n
+        :param phases: names of the phases in order \n
+        :param timings: list with (seconds, animals) per phase, see run_cell_phases_timed \n
+        """
+        for phase, (seconds, animals) in zip(phases, timings):
+            self.record(phase, landscape, seconds, animals)
+
+    @contextmanager
+    def measure(self, phase, landscape, animals):
+        """
+        Records the code run in the context as one call of a phase \n
+        :param phase: name of the phase \n
+        :param landscape: name of the landscape type, or 'Island' \n
+        :param animals: number of animals when the phase starts \n
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.record(phase, landscape, perf_counter() - start, animals)
+
+    def end_year(self):
+        """
+        Adds the timings of the current year to the totals and starts a new year \n
+        :return: structured array with TIMING_DTYPE and one row per phase and landscape of \n
+        the year that ended \n
+        """
+        rows = np.array([(phase, landscape, *entry)
+                         for (phase, landscape), entry in self._year.items()],
+                        dtype=TIMING_DTYPE)
+        for key, entry in self._year.items():
+            total = self._totals.setdefault(key, [0., 0, 0])
+            for i, value in enumerate(entry):
+                total[i] += value
+        self._year = {}
+        return rows
+
+    def report(self):
+        """
+        The totals of all finished years \n
+        :return: dictionary with phase as key and a dictionary with 'time', 'calls', \n
+        'animals' and 'landscapes' as value, where 'landscapes' holds the same three values \n
+        per landscape type \n
+        """
+        report = {}
+        for (phase, landscape), (seconds, calls, animals) in self._totals.items():
+            phase_report = report.setdefault(phase, {'time': 0., 'calls': 0, 'animals': 0,
+                                                     'landscapes': {}})
+            phase_report['time'] += seconds
+            phase_report['calls'] += calls
+            phase_report['animals'] += animals
+            phase_report['landscapes'][landscape] = {'time': seconds, 'calls': calls,
+                                                     'animals': animals}
+        return report
@@ -0,0 +1,200 @@
+# -*- coding: utf-8 -*-
+
+"""
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import glob
+import queue
+import threading
+
+import numpy as np
+
+
+class ResultsSink:
+    """
+    Base class for the objects BioSim writes the yearly animal counts to. A sink is given to \n
+    BioSim with the results argument, and write is called once after every simulated year \n
+    """
+
+    def write(self, year, counts):
+        """
+        Receives the animal counts of one year \n
+        :param year: the year that was just simulated \n
+        :param counts: dictionary with species as key and an array with the animal count per \n
+        cell as value \n
+        """
+        raise NotImplementedError
+
+    def write_timings(self, year, timings):
+        """
+        Receives the phase timings of one year. Only called when BioSim measures its phases, \n
+        and before write for the same year. Sinks that do not store timings ignore them \n
+        :param year: the year that was just simulated \n
+        :param timings: structured array with one row per phase and landscape type, see \n
+        PhaseTimer.end_year \n
+        """
+
+    def flush(self):
+        """
+        Makes sure everything received so far has been stored \n
+        """
+
+    def close(self):
+        """
+        Stores everything received and releases the resources of the sink. Called at the end \n
+        of every simulate, also when a year raised, so a sink must accept more years after \n
+        close if simulate is called again \n
+        """
+        self.flush()
+
+
+class NpzResultsWriter(ResultsSink):
+    """
+    Stores the yearly animal counts in chunked .npz files. The counts are collected in \n
+    batches of batch_size years, and each batch is written by a background thread to \n
+    '{path}_{chunk:05d}.npz', so the simulation does not wait for the disk. The thread is \n
+    stopped by close and started again by the next batch. Each file holds a 'year' array \n
+    and one array per species with shape (years, rows, cols). If the phases \n
+    are measured, the file also holds a 'timings' array with the rows of those years and a \n
+    'timing_year' array with the year of each row. \n
+    """
+
+    def __init__(self, path, every=1, batch_size=100, max_pending=4):
+        """
+        Constructor for the npz writer \n
+        :param path: beginning of the file names, including the directory \n
+        :param every: only every this many years are stored \n
+        :param batch_size: number of stored years in each file \n
+        :param max_pending: number of batches that can wait for the writer thread before \n
+        write blocks \n
+        """
+        if every < 1 or batch_size < 1:
+            raise ValueError("every and batch_size must be at least 1")
+        self.path = path
+        self.every = every
+        self.batch_size = batch_size
+        self._years = []
+        self._counts = {}
+        self._timings = []
+        self._chunk = 0
+        self._error = None
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._start()
+
+    def _start(self):
+        """
+        Starts the writer thread if it is not running \n
+        """
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._write_chunks, daemon=True)
+            self._thread.start()
+
+    def _write_chunks(self):
+        """
+        Runs in the writer thread and saves the batches put on the queue until None is put \n
+        """
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                file_name, arrays = item
+                if self._error is None:
+                    np.savez(file_name, **arrays)
+            except Exception as err:
+                self._error = err
+            finally:
+                self._queue.task_done()
+
+    def _check_error(self):
+        """
+        Raises the error of the writer thread in the simulation thread \n
+        """
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise RuntimeError('Writing results failed: {}'.format(error)) from error
+
+    def write(self, year, counts):
+        """
+        Adds the counts of a year to the current batch, and hands the batch to the writer \n
+        thread when it is full \n
+        :param year: the year that was just simulated \n
+        :param counts: dictionary with species as key and the count per cell as value \n
+        """
+        self._check_error()
+        if year % self.every != 0:
+            return
+        self._years.append(year)
+        for species, count in counts.items():
+            self._counts.setdefault(species, []).append(np.array(count))
+        if len(self._years) >= self.batch_size:
+            self._hand_over()
+
+    def write_timings(self, year, timings):
+        """
+        Adds the phase timings of a year to the current batch \n
+        :param year: the year that was just simulated \n
+        :param timings: structured array with one row per phase and landscape type \n
+        """
+        self._check_error()
+        if year % self.every == 0:
+            self._timings.append((np.full(len(timings), year), timings))
+
+    def _hand_over(self):
+        """
+        Puts the current batch on the queue of the writer thread and starts a new batch \n
+        """
+        if not self._years:
+            return
+        arrays = {species: np.stack(count) for species, count in self._counts.items()}
+        arrays['year'] = np.array(self._years)
+        if self._timings:
+            arrays['timing_year'] = np.concatenate([year for year, _ in self._timings])
+            arrays['timings'] = np.concatenate([timings for _, timings in self._timings])
+        file_name = '{}_{:05d}.npz'.format(self.path, self._chunk)
+        self._start()
+        self._queue.put((file_name, arrays))
+        self._chunk += 1
+        self._years = []
+        self._counts = {}
+        self._timings = []
+
+    def flush(self):
+        """
+        Writes the current batch, even if it is not full, and waits until all batches are \n
+        on disk \n
+        """
+        self._hand_over()
+        self._queue.join()
+        self._check_error()
+
+    def close(self):
+        """
+        Writes everything and stops the writer thread. The thread is stopped even if writing \n
+        failed, and the error is raised afterwards \n
+        """
+        try:
+            self.flush()
+        finally:
+            if self._thread.is_alive():
+                self._queue.put(None)
+                self._thread.join()
+
+
+def read_results(path):
+    """
+    Reads the chunks written by NpzResultsWriter back into one set of arrays \n
+    :param path: the path given to the writer \n
+    :return: dictionary with 'year' and one array per species \n
+    """
+    file_names = sorted(glob.glob(glob.escape(path) + '_[0-9][0-9][0-9][0-9][0-9].npz'))
+    if not file_names:
+        raise FileNotFoundError('No results found for ' + str(path))
+    chunks = []
+    for file_name in file_names:
+        with np.load(file_name) as chunk:
+            chunks.append({key: chunk[key] for key in chunk.files})
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
@@ -5,34 +5,45 @@
 __author__ = "Ashesh Raj Gnawali, Maritn Bø"
 __email__ = "asgn@nmbu.no & mabo@nmbu.no"
 
+import json
 import os
+import queue
+import threading
 
-import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
 import subprocess
 
-from biosim.island import Island
+from biosim.island import Island, per_animal
+from biosim.array_island import ArrayIsland
+from biosim.cohort_island import CohortIsland
 from biosim.landscape import Water, Desert, Lowland, Highland
 from biosim.fauna import Carnivore, Herbivore
-from biosim.graphics import Graphics
+from biosim.movie import FFMPEG_BINARY, MovieWriter
+from biosim.parameters import parameter_class
+from biosim.profiling import PhaseTimer
 
 DEFAULT_GRAPHICS_DIR = os.path.join('results/')
 DEFAULT_GRAPHICS_NAME = 'biosim'
 DEFAULT_MOVIE_FORMAT = 'mp4'
 
-FFMPEG_BINARY = 'ffmpeg'
 CONVERT_BINARY = 'magick'
 
 
 class BioSim:
     def __init__(self, island_map, ini_pop, seed, ymax_animals=None, cmax_animals=None,
-                 img_base=None, img_fmt="png", hist_specs=None):
+                 img_base=None, img_fmt="png", hist_specs=None, engine="object",
+                 workers=None, pool="thread", results=None, debug=False, stream_movie=False,
+                 async_graphics=False, max_frames=2, checkpoint_path=None,
+                 checkpoint_years=None, timing=False, weight_step=0.5):
 
         """
         :param island_map: Multi-line string specifying island geography
         :param ini_pop: List of dictionaries specifying initial population
-        :param seed: Integer used as random number seed
+        :param seed: Integer used as random number seed. The simulation owns a numpy random
+        Generator (PCG64) seeded with it, and every random decision on the island is drawn from
+        it. Two simulations with the same seed, map, population and parameters therefore give
+        identical results, and simulations in the same process do not affect each other. The
+        global numpy random state is neither seeded nor used.
         :param ymax_animals: Number specifying y-axis limit for graph showing animal numbers
         :param cmax_animals: Dict specifying color-code limits for animal densities
         :param hist_specs: Specifications for histograms, see below
@@ -53,12 +64,57 @@ class BioSim:
         '{}_{:05d}.{}'.format(img_base, img_no, img_fmt)
         where img_no are consecutive image numbers starting from 0. \n
         img_base should contain a path and beginning of a file name. \n
-        """
-
-        self.landscapes = {'W': Water, 'L': Lowland, 'H': Highland, 'D': Desert}
-        self.landscapes_with_parameters = [Highland, Lowland]
-
-        self.animal_species = {'Carnivore': Carnivore, 'Herbivore': Herbivore}
+        If stream_movie is True no image files are written. Instead every image is piped \n
+        straight into ffmpeg while simulating, and make_movie finishes the movie \n
+        '{img_base}.mp4'. \n
+        If async_graphics is True the years are simulated in a background thread, which hands \n
+        a snapshot of the population to the drawing thread for every year that is shown. At \n
+        most max_frames snapshots wait to be drawn. When drawing falls behind, shown-only \n
+        years are dropped or skipped for a newer one, so the simulation never waits for \n
+        drawing. Years that are saved as images are never dropped. \n
+        If checkpoint_path and checkpoint_years are given, a checkpoint is saved to \n
+        checkpoint_path every checkpoint_years years, see save_checkpoint. \n
+        engine selects how the population is stored: 'object' keeps one Fauna object per \n
+        animal, 'array' keeps all animals in numpy arrays and runs each yearly phase as batched \n
+        array operations, which is much faster for large populations. 'cohort' keeps the \n
+        number of animals of every age and weight in each cell and draws the fate of whole \n
+        cohorts at once, so huge populations cost about as much as small ones. It follows \n
+        the population dynamics, not individual animals, see CohortIsland. weight_step sets \n
+        the spacing of its weight grid and is only used by the cohort engine. \n
+        workers sets the number of workers that run the cell-local phases (feeding, birth, \n
+        ageing and death) of the object engine in parallel, and pool chooses between a \n
+        'thread' and a 'process' pool. The array engine has no worker pool and raises \n
+        ValueError for more than one worker. Every cell draws from its own random stream, so the \n
+        results do not depend on the number of workers. Neither pool scales close to linearly \n
+        with the number of workers: the thread pool only runs in parallel while numpy releases \n
+        the GIL, and the process pool pickles every occupied cell with all its animals to a \n
+        worker and back twice a year. On a 21x21 island with 50 herbivores per cell a year \n
+        took 1.2 s with four process workers against 0.5 s without workers on one CPU. The \n
+        default is therefore the thread pool, and the process pool is only worth trying for \n
+        few, very crowded cells on many cores. For large populations the array and cohort \n
+        engines are much faster than any pool. \n
+        results is an optional ResultsSink, e.g. NpzResultsWriter, that receives the animal \n
+        count per cell of every simulated year. Nothing is written to disk if it is None. \n
+        The sink is closed at the end of every simulate, also when a year raises. \n
+        The island keeps running population counters that are updated by births, deaths, kills \n
+        and migrations, so the population queries do not recount the island. If debug is True \n
+        the counters are checked against a full recount every year. \n
+        Every simulation works on its own subclasses of the species and landscape classes, \n
+        made with parameter_class, so set_animal_parameters and set_landscape_parameters only \n
+        change this simulation. The subclasses start out with the parameters the base classes \n
+        have when the simulation is created. \n
+        If timing is True the wall time, the number of calls and the number of animals \n
+        processed are measured for every phase and landscape type, see perf_report. The \n
+        timings of every year are also handed to the results sink. \n
+        """
+
+        self.landscapes = {letter: parameter_class(landscape) for letter, landscape in
+                           {'W': Water, 'L': Lowland, 'H': Highland, 'D': Desert}.items()}
+        self.landscapes_with_parameters = [self.landscapes['H'], self.landscapes['L']]
+
+        self.animal_species = {'Carnivore': parameter_class(Carnivore),
+                               'Herbivore': parameter_class(Herbivore)}
+        self.engines = {'object': Island, 'array': ArrayIsland, 'cohort': CohortIsland}
 
         for char in island_map.replace('\n', ''):
             if char not in self.landscapes:
@@ -67,10 +123,20 @@ class BioSim:
         lengths = [len(line) for line in island_map.splitlines()]
         if len(set(lengths)) > 1:
             raise ValueError('This given string is not uniform')
+        if engine not in self.engines:
+            raise ValueError('Unknown engine ' + str(engine))
         self.island_map = island_map
-        self._map = Island(island_map)
-        np.random.seed(seed)
+        self.engine = engine
+        self._rng = np.random.default_rng(seed)
+        fauna = {species: self.animal_species[species] for species in ('Herbivore', 'Carnivore')}
+        self._timer = PhaseTimer() if timing else None
+        options = {'weight_step': weight_step} if engine == 'cohort' else {}
+        self._map = self.engines[engine](island_map, rng=self._rng, workers=workers, pool=pool,
+                                         debug=debug, fauna=fauna, landscapes=self.landscapes,
+                                         timer=self._timer, **options)
+        self._snapshot = None
         self.add_population(ini_pop)
+        self.results = results
 
         if ymax_animals is None:
             self.ymax_animals = 20000
@@ -91,9 +157,25 @@ class BioSim:
             self._hist_specs = {'weight': {'max': 80, 'delta': 2},
                                 'fitness': {'max': 1.0, 'delta': 0.05},
                                 'age': {'max': 80, 'delta': 2}}
+        else:
+            for prop, specs in hist_specs.items():
+                if prop not in ('weight', 'age', 'fitness'):
+                    raise ValueError('Histograms can only be shown for weight, age and fitness')
+                if specs['max'] <= 0 or specs['delta'] <= 0:
+                    raise ValueError('max and delta of the histograms must be positive')
+            self._hist_specs = hist_specs
 
         self.img_fmt = img_fmt
         self.img_counter = 0
+        self.stream_movie = stream_movie
+        self._movie = None
+        self.async_graphics = async_graphics
+        self.max_frames = max_frames
+        self.frames_dropped = 0
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_years = checkpoint_years
+        self._profiler = None
+        self._profile_years = ()
 
         self.vis = None
         self._year = 0
@@ -108,8 +190,8 @@ class BioSim:
         """
         if species in self.animal_species:
             species_type = self.animal_species[species]
-            animal = species_type()
-            animal.set_parameters(params)
+            species_type.set_parameters(params)
+            self._snapshot = None
         else:
             raise TypeError(species + ' parameters cant be assigned,there is no such data type')
 
@@ -138,32 +220,212 @@ class BioSim:
         :param img_years: years between visualizations saved to files \n
         (default: vis_years) \n
         Image files will be numbered consecutively. \n
+        If both vis_years and img_years are None the simulation runs headless: no figure is \n
+        created and matplotlib is never imported. \n
+        A streamed movie stays open between calls and is finished by make_movie. If a year \n
+        or drawing raises, the movie is finished with the frames written so far, so ffmpeg \n
+        does not keep running. \n
         """
         if img_years is None:
             img_years = vis_years
+        headless = vis_years is None and img_years is None
 
         self.final_year = self._year + num_years
-        self.setup_graphics()
-        if self._year > 1:
-            self.vis.create_animal_graphs(self.final_year, self.ymax_animals, recreate=True)
-
-        while self._year < self.final_year:
-            if self._year % vis_years == 0:
-                self.update_graphics()
-
-            if (self._year + 1) % img_years == 0:
-                self.save_graphics()
-
+        if not headless:
+            self.setup_graphics()
+            if self._year > 1:
+                self.vis.create_animal_graphs(self.final_year, self.ymax_animals, recreate=True)
+
+        try:
+            if self.async_graphics and not headless:
+                self.simulate_async(vis_years, img_years)
+            else:
+                while self._year < self.final_year:
+                    if vis_years is not None and self._year % vis_years == 0:
+                        self.update_graphics()
+
+                    if img_years is not None and (self._year + 1) % img_years == 0:
+                        if vis_years is None:
+                            self.update_graphics()
+                        self.save_graphics()
+
+                    self.simulate_year()
+        except BaseException:
+            self.close_movie()
+            raise
+        finally:
+            self._map.close()
+            if self.results is not None:
+                self.results.close()
+
+    def simulate_year(self):
+        """
+        Runs the life cycle of one year and hands the counts to the results sink \n
+        """
+        if self._profiler is not None and self._year + 1 in self._profile_years:
+            self._profiler.enable()
+            try:
+                self._map.life_cycle_in_rossumoya()
+            finally:
+                self._profiler.disable()
+        else:
             self._map.life_cycle_in_rossumoya()
-            self._year += 1
-
-            df = self.animal_distribution
-            df.to_csv('data.csv', sep='\t', encoding='utf-8')
+        self._year += 1
+        self._snapshot = None
+
+        if self._timer is not None:
+            timings = self._timer.end_year()
+            if self.results is not None:
+                self.results.write_timings(self._year, timings)
+        if self.results is not None:
+            self.results.write(self._year, {species: self._map.count_map(species)
+                                            for species in self.animal_species})
+        if self.checkpoint_years and self._year % self.checkpoint_years == 0:
+            self.save_checkpoint(self.checkpoint_path)
+
+    def perf_report(self):
+        """
+        The phase timings of all years simulated so far. Only available if the simulation \n
+        was created with timing=True \n
+        :return: dictionary with phase as key and a dictionary with 'time', 'calls', \n
+        'animals' and 'landscapes' as value, see PhaseTimer.report \n
+        """
+        if self._timer is None:
+            raise RuntimeError('Phase timing is off, create BioSim with timing=True')
+        return self._timer.report()
+
+    def profile(self, years, profiler=None):
+        """
+        Attaches a profiler to a range of years. The profiler is enabled right before the \n
+        life cycle of each of these years and disabled right after it, so graphics, results \n
+        and checkpoints are left out. Any object with enable and disable methods can be \n
+        used, e.g. a small wrapper that starts and stops a sampling profiler \n
+        :param years: the years to profile, e.g. range(100, 110), numbered like year after \n
+        the year has been simulated \n
+        :param profiler: the profiler, a new cProfile.Profile if None \n
+        :return: the profiler, e.g. for pstats.Stats(profiler) \n
+        """
+        if profiler is None:
+            import cProfile
+            profiler = cProfile.Profile()
+        self._profiler = profiler
+        self._profile_years = years
+        return profiler
+
+    def save_checkpoint(self, path):
+        """
+        Saves the full state of the simulation to a compressed npz file: every animal, the \n
+        fodder, the parameters of all species and landscapes, the year, the image counter \n
+        and the state of every random generator. A simulation loaded with load_checkpoint \n
+        continues exactly like this one would. The file is written next to path first and \n
+        then moved into place, so a crash never leaves a half written checkpoint \n
+        :param path: file name of the checkpoint \n
+        """
+        arrays, island_state = self._map.get_state()
+        classes = list(self.animal_species.values()) + list(self.landscapes.values())
+        state = {'island_map': self.island_map, 'engine': self.engine, 'year': self._year,
+                 'img_counter': self.img_counter, 'rng': self._rng.bit_generator.state,
+                 'island': island_state,
+                 'parameters': {class_type.__name__: dict(class_type.parameters)
+                                for class_type in classes}}
+        temporary_path = path + '.tmp'
+        with open(temporary_path, 'wb') as checkpoint:
+            np.savez_compressed(checkpoint, state=np.array(json.dumps(state)), **arrays)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load_checkpoint(cls, path, **kwargs):
+        """
+        Creates a simulation from a checkpoint saved with save_checkpoint. The parameters of \n
+        the species and landscapes are set to the saved values \n
+        :param path: file name of the checkpoint \n
+        :param kwargs: other arguments for BioSim, e.g. img_base or workers \n
+        :return: BioSim object \n
+        """
+        with np.load(path) as checkpoint:
+            state = json.loads(str(checkpoint['state']))
+            arrays = {key: checkpoint[key] for key in checkpoint.files if key != 'state'}
+        sim = cls(state['island_map'], [], seed=None, engine=state['engine'], **kwargs)
+        classes = list(sim.animal_species.values()) + list(sim.landscapes.values())
+        for class_type in classes:
+            class_type.set_parameters(state['parameters'][class_type.__name__])
+        sim._map.set_state(arrays, state['island'])
+        sim._rng.bit_generator.state = state['rng']
+        sim._year = state['year']
+        sim.img_counter = state['img_counter']
+        return sim
+
+    def simulate_async(self, vis_years, img_years):
+        """
+        Simulates until final_year in a background thread while this thread draws the \n
+        snapshots it publishes. matplotlib is only used from this thread. The background \n
+        thread is stopped and joined before returning, also when drawing raises. Each thread \n
+        counts the frames it drops itself, and frames_dropped is only updated here after the \n
+        join \n
+        :param vis_years: years between visualization updates, or None \n
+        :param img_years: years between visualizations saved to files, or None \n
+        """
+        frames = queue.Queue(maxsize=self.max_frames)
+        stop = threading.Event()
+        errors = []
+        skipped = 0
+
+        def put(frame):
+            while not stop.is_set():
+                try:
+                    frames.put(frame, timeout=0.1)
+                    return
+                except queue.Full:
+                    pass
+
+        def run():
+            nonlocal skipped
+            try:
+                while self._year < self.final_year and not stop.is_set():
+                    show = vis_years is not None and self._year % vis_years == 0
+                    save = img_years is not None and (self._year + 1) % img_years == 0
+                    if save:
+                        put((self._year, self.snapshot(), True))
+                    elif show:
+                        try:
+                            frames.put_nowait((self._year, self.snapshot(), False))
+                        except queue.Full:
+                            skipped += 1
+                    self.simulate_year()
+            except BaseException as err:
+                errors.append(err)
+            finally:
+                put(None)
+
+        simulation = threading.Thread(target=run, daemon=True)
+        simulation.start()
+        dropped = 0
+        try:
+            while True:
+                frame = frames.get()
+                if frame is None:
+                    break
+                year, snapshot, save = frame
+                if not save and not frames.empty():
+                    dropped += 1
+                    continue
+                self.update_graphics(snapshot, year)
+                if save:
+                    self.save_graphics()
+        finally:
+            stop.set()
+            simulation.join()
+            self.frames_dropped += dropped + skipped
+        if errors:
+            raise errors[0]
 
     def setup_graphics(self):
         """
         Setup the graphics \n
         """
+        import matplotlib.pyplot as plt
+        from biosim.graphics import Graphics
+
         map_dims = self._map.map_dims
 
         if self.vis is None:
@@ -174,40 +436,54 @@ class BioSim:
             self.vis.create_animal_graphs(self.final_year, self.ymax_animals)
 
             self.vis.animal_distribution_graphs()
-            self.vis.create_histograms_setup()
+            self.vis.create_histograms_setup(self._hist_specs)
+            plt.show(block=False)
 
-    def update_graphics(self):
+    def update_graphics(self, snapshot=None, year=None):
         """
         Updates graphics with current data. \n
+        :param snapshot: Snapshot to draw, the current population if None \n
+        :param year: year of the snapshot, the current year if None \n
         """
-        df = self.animal_distribution
-        rows, cols = self._map.map_dims
-        dist_matrix_carnivore = np.array(df[['Carnivore']]).reshape(rows, cols)
-        dist_matrix_herbivore = np.array(df[['Herbivore']]).reshape(rows, cols)
+        if snapshot is None:
+            snapshot = self.snapshot()
+        if year is None:
+            year = self._year
 
         # updates the line graphs
-        herb_count, carn_count = list(self.num_animals_per_species.values())
-        self.vis.update_graphs(self._year, herb_count, carn_count)
+        herb_count = snapshot.counts['Herbivore'].sum()
+        carn_count = snapshot.counts['Carnivore'].sum()
+        self.vis.update_graphs(year, herb_count, carn_count)
 
-        self.vis.update_herbivore_distribution(dist_matrix_herbivore)
-        self.vis.update_carnivore_distribution(dist_matrix_carnivore)
+        self.vis.update_herbivore_distribution(snapshot.counts['Herbivore'])
+        self.vis.update_carnivore_distribution(snapshot.counts['Carnivore'])
 
         # histogram
-        self.vis.update_histogram(fit_list=self.animals_fitness, age_list=self.animal_ages,
-                                  wt_list=self.animal_weights)
-        # plt.pause(1)
-        plt.pause(1e-6)
-        self.vis.set_year
+        self.vis.update_histogram(fit_list=snapshot.fitness, age_list=snapshot.age,
+                                  wt_list=snapshot.weight, repeats=snapshot.repeats)
+        self.vis.refresh()
 
     def save_graphics(self):
         """
         Save the graphics \n
         """
+        import matplotlib.pyplot as plt
+
         if self.img_base is None:
             return
 
-        plt.savefig('{base}_{num:05d}.{type}'.format(base=self.img_base, num=self.img_counter,
-                                                     type=self.img_fmt))
+        if self.stream_movie:
+            if self._movie is None:
+                self._movie = MovieWriter('{}.{}'.format(self.img_base, DEFAULT_MOVIE_FORMAT))
+            with self.vis.all_artists_drawn():
+                self._movie.write_frame(self.vis.fig)
+            self.img_counter += 1
+            return
+
+        with self.vis.all_artists_drawn():
+            plt.savefig('{base}_{num:05d}.{type}'.format(base=self.img_base,
+                                                         num=self.img_counter,
+                                                         type=self.img_fmt))
         self.img_counter += 1
 
     def add_population(self, population):
@@ -217,15 +493,31 @@ class BioSim:
         :param population: List of dictionaries specifying population \n
         """
         self._map.add_animals(population)
+        self._snapshot = None
+
+    def close_movie(self):
+        """
+        Finishes the streamed movie, if one is being written \n
+        """
+        movie, self._movie = self._movie, None
+        if movie is not None:
+            movie.close()
 
     def make_movie(self, movie_fmt=DEFAULT_MOVIE_FORMAT):
         """
         Source: Hans Ekkehard Plesser, Randviz project \n
-        Create MPEG4 movie from visualization images saved. \n
+        Create MPEG4 movie from visualization images saved. If the images were streamed to \n
+        ffmpeg the movie is finished instead. \n
         """
         if self.img_base is None:
             raise RuntimeError('No filename defined')
 
+        if self.stream_movie:
+            if movie_fmt != DEFAULT_MOVIE_FORMAT:
+                raise ValueError('Streamed movies are always ' + DEFAULT_MOVIE_FORMAT)
+            self.close_movie()
+            return
+
         if movie_fmt == 'mp4':
             try:
                 subprocess.check_call(
@@ -259,7 +551,7 @@ class BioSim:
         animal_count = 0
         for species in self.animal_species:
             animal_count += self._map.number_of_animals_per_species(species)
-            return animal_count
+        return animal_count
 
     @property
     def num_animals_per_species(self):
@@ -271,69 +563,55 @@ class BioSim:
             num_fauna_per_species[species] = self._map.number_of_animals_per_species(species)
         return num_fauna_per_species
 
+    def snapshot(self):
+        """
+        The current state of the population, collected in one pass over the island. The \n
+        snapshot is kept until the next year is simulated, animals are added or the animal \n
+        parameters change, so the graphics, animal_weights, animal_ages and animals_fitness \n
+        of the same year share one pass. The arrays are shared and must not be changed. \n
+        :return: Snapshot with the fields counts, age, weight, fitness and repeats. counts \n
+        maps each species to an array with the animal count per cell, the others map each \n
+        species to an array of values. repeats is None when there is one value per animal, the \n
+        cohort engine gives one value per cohort and the number of animals in repeats, see \n
+        per_animal \n
+        """
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self._snapshot = self._map.snapshot()
+        return snapshot
+
     @property
     def animal_distribution(self):
         """
-        Pandas DataFrame with animal count per species for each cell on the island. \n
+        Pandas DataFrame with animal count per species for each cell on the island. pandas is \n
+        only imported when this is used. \n
         """
-        animal_df = []
+        import pandas as pd
+
+        counts = self.snapshot().counts
         rows, cols = self._map.map_dims
-        for row in range(rows):
-            for col in range(cols):
-                cell = self._map.cells[row, col]
-                animal_count = cell.cell_fauna_count
-                animal_df.append({'Row': row, 'Col': col, 'Herbivore': animal_count['Herbivore'],
-                                  'Carnivore': animal_count['Carnivore']})
-        return pd.DataFrame(animal_df)
+        row_index, col_index = np.indices((rows, cols))
+        return pd.DataFrame({'Row': row_index.ravel(), 'Col': col_index.ravel(),
+                             'Herbivore': counts['Herbivore'].ravel(),
+                             'Carnivore': counts['Carnivore'].ravel()})
 
     @property
     def animal_weights(self):
         """
-        Returns a dictionary with weights of each animal according to the species /n
+        Returns a dictionary with an array of the weights of the animals of each species /n
         """
-
-        weights = {"Herbivore": [], "Carnivore": []}
-        rows, cols = self._map.map_dims
-        for row in range(rows):
-            for col in range(cols):
-                cell = self._map.cells[row][col]
-                for animal in cell.fauna_dict["Herbivore"]:
-                    weights['Herbivore'].append(animal.weight)
-                for animal in cell.fauna_dict["Carnivore"]:
-                    weights['Carnivore'].append(animal.weight)
-
-        return weights
+        return per_animal(self.snapshot(), 'weight')
 
     @property
     def animals_fitness(self):
         """
-        Returns a dictionary with weights of each animal according to the species /n
+        Returns a dictionary with an array of the fitness of the animals of each species /n
         """
-        fitness = {"Herbivore": [], "Carnivore": []}
-        rows, cols = self._map.map_dims
-        for row in range(rows):
-            for col in range(cols):
-                cell = self._map.cells[row][col]
-                for animal in cell.fauna_dict["Herbivore"]:
-                    fitness['Herbivore'].append(animal.animal_fitness)
-                for animal in cell.fauna_dict["Carnivore"]:
-                    fitness['Carnivore'].append(animal.animal_fitness)
-
-        return fitness
+        return per_animal(self.snapshot(), 'fitness')
 
     @property
     def animal_ages(self):
         """
-        Returns a dictionary with weights of each animal according to the species /n
+        Returns a dictionary with an array of the ages of the animals of each species /n
         """
-        age = {"Herbivore": [], "Carnivore": []}
-        rows, cols = self._map.map_dims
-        for row in range(rows):
-            for col in range(cols):
-                cell = self._map.cells[row][col]
-                for animal in cell.fauna_dict["Herbivore"]:
-                    age['Herbivore'].append(animal.age)
-                for animal in cell.fauna_dict["Carnivore"]:
-                    age['Carnivore'].append(animal.age)
-
-        return age
+        return per_animal(self.snapshot(), 'age')
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+"""
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from biosim.ensemble import run_replicate
+from biosim.simulation import BioSim
+
+
+def grid_design(space):
+    """
+    Every combination of the given parameter values \n
+    :param space: dictionary mapping (species name or landscape letter, parameter name) to a \n
+    list of values, e.g. {('Herbivore', 'beta'): [0.7, 0.9], ('L', 'f_max'): [400, 800]} \n
+    :return: list of points, each a dictionary with the same keys as space \n
+    """
+    keys = list(space)
+    return [dict(zip(keys, values)) for values in itertools.product(*space.values())]
+
+
+def latin_hypercube_design(space, num_points, seed=None):
+    """
+    A Latin hypercube sample of the given parameter ranges. Each range is split into \n
+    num_points intervals of equal width, and every interval of every parameter is used by \n
+    exactly one point \n
+    :param space: dictionary mapping (species name or landscape letter, parameter name) to \n
+    a (low, high) range \n
+    :param num_points: number of points \n
+    :param seed: seed of the numpy random Generator drawing the sample \n
+    :return: list of points, each a dictionary with the same keys as space \n
+    """
+    if num_points < 1:
+        raise ValueError('A design needs at least one point')
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for key, (low, high) in space.items():
+        if high < low:
+            raise ValueError('The range of {} is empty'.format(key))
+        interval = rng.permutation(num_points) + rng.random(num_points)
+        columns[key] = low + (high - low) * interval / num_points
+    return [{key: float(columns[key][i]) for key in space} for i in range(num_points)]
+
+
+def run_point(island_map, ini_pop, seeds, num_years, engine, parameters):
+    """
+    Runs all replicates of one point of a sweep. This is a module level function so that it \n
+    can be sent to worker processes \n
+    :param island_map: Multi-line string specifying island geography \n
+    :param ini_pop: List of dictionaries specifying initial population \n
+    :param seeds: one numpy SeedSequence per replicate \n
+    :param num_years: number of years to simulate \n
+    :param engine: 'object', 'array' or 'cohort' \n
+    :param parameters: all parameters of the point, see run_replicate \n
+    :return: dictionary with species as key and an array of shape (replicates, years) \n
+    """
+    replicates = [run_replicate(island_map, ini_pop, seed, num_years, engine, parameters)
+                  for seed in seeds]
+    return {species: np.array([counts[species] for counts in replicates])
+            for species in replicates[0]}
+
+
+class Sweep:
+    """
+    Runs the same island and population over a design of Fauna and Landscape parameters, \n
+    e.g. from grid_design or latin_hypercube_design. Every point is run with the same \n
+    replicate seeds, so the differences between points come from the parameters and not \n
+    from the random streams. Points run in worker processes, each with its own simulations, \n
+    and finished points can be cached on disk so that an interrupted sweep is resumed \n
+    instead of started over. \n
+    """
+
+    def __init__(self, island_map, ini_pop, points, num_years, seed, num_replicates=1,
+                 engine="object", workers=None, cache_dir=None):
+        """
+        Constructor for the sweep \n
+        :param island_map: Multi-line string specifying island geography \n
+        :param ini_pop: List of dictionaries specifying initial population \n
+        :param points: list of points, each a dictionary mapping (species name or landscape \n
+        letter, parameter name) to a value. Parameters that are not in a point keep the \n
+        values the classes have when the sweep is created \n
+        :param num_years: number of years to simulate every replicate \n
+        :param seed: seed of the sweep, the replicate seeds are spawned from it \n
+        :param num_replicates: number of replicates per point \n
+        :param engine: 'object', 'array' or 'cohort', see BioSim \n
+        :param workers: number of worker processes, None runs the points one by one in this \n
+        process. The results do not depend on it \n
+        :param cache_dir: directory where every finished point is stored, None for no cache \n
+        """
+        if num_replicates < 1:
+            raise ValueError('A sweep needs at least one replicate per point')
+        self.island_map = island_map
+        self.ini_pop = ini_pop
+        self.points = [dict(point) for point in points]
+        self.num_years = num_years
+        self.seed = seed
+        self.num_replicates = num_replicates
+        self.seeds = np.random.SeedSequence(seed).spawn(num_replicates)
+        self.engine = engine
+        self.workers = workers
+        self.cache_dir = cache_dir
+        self.parameter_names = sorted({key for point in self.points for key in point})
+        self.parameters = [self.point_parameters(point) for point in self.points]
+        self.results = [None] * len(self.points)
+        self.num_cached = 0
+
+    def point_parameters(self, point):
+        """
+        All species and landscape parameters of a point. The point is applied to a new \n
+        simulation, so unknown or invalid parameters raise before anything is run \n
+        :param point: dictionary mapping (name, parameter name) to a value \n
+        :return: dictionary mapping species names and landscape letters to their parameters \n
+        """
+        sim = BioSim(self.island_map, [], seed=0, engine=self.engine)
+        changes = {}
+        for (name, key), value in point.items():
+            changes.setdefault(name, {})[key] = value
+        for name, params in changes.items():
+            if name in sim.animal_species:
+                sim.set_animal_parameters(name, params)
+            else:
+                sim.set_landscape_parameters(name, params)
+        classes = list(sim.animal_species.items()) + list(sim.landscapes.items())
+        return {name: dict(class_type.parameters) for name, class_type in classes}
+
+    def cache_file(self, index):
+        """
+        The cache file of a point. The name is a hash of everything the result depends on, \n
+        so a changed map, population, seed or parameter never reuses an old result. The \n
+        entropy of the replicate seeds is hashed rather than the seed, so a sweep with seed \n
+        None only finds its own points and never those of another random stream \n
+        :param index: number of the point \n
+        :return: file name \n
+        """
+        key = json.dumps([self.island_map, self.ini_pop, self.seeds[0].entropy,
+                          self.num_replicates, self.num_years, self.engine,
+                          self.parameters[index]], sort_keys=True)
+        digest = hashlib.sha1(key.encode()).hexdigest()
+        return os.path.join(self.cache_dir, 'point_{}.npz'.format(digest))
+
+    def load_cached(self, index):
+        """
+        :param index: number of the point \n
+        :return: the cached result of the point, None if it is not cached \n
+        """
+        if self.cache_dir is None or not os.path.exists(self.cache_file(index)):
+            return None
+        with np.load(self.cache_file(index)) as cached:
+            return {species: cached[species] for species in cached.files}
+
+    def store(self, index, counts):
+        """
+        Stores the result of a point in the cache. The file is written next to its final \n
+        name first and then moved into place, so an interrupted sweep never leaves a half \n
+        written point \n
+        :param index: number of the point \n
+        :param counts: dictionary with species as key and an array of shape (replicates, years) \n
+        """
+        self.results[index] = counts
+        if self.cache_dir is None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self.cache_file(index)
+        with open(path + '.tmp', 'wb') as cache:
+            np.savez(cache, **counts)
+        os.replace(path + '.tmp', path)
+
+    def run(self):
+        """
+        Runs every point that is not cached yet \n
+        :return: the results table, see rows \n
+        """
+        self.num_cached = 0
+        missing = []
+        for index in range(len(self.points)):
+            self.results[index] = self.load_cached(index)
+            if self.results[index] is None:
+                missing.append(index)
+            else:
+                self.num_cached += 1
+
+        arguments = (self.island_map, self.ini_pop, self.seeds, self.num_years, self.engine)
+        if self.workers is None or self.workers <= 1:
+            for index in missing:
+                self.store(index, run_point(*arguments, self.parameters[index]))
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                futures = {executor.submit(run_point, *arguments, self.parameters[index]): index
+                           for index in missing}
+                for future in as_completed(futures):
+                    self.store(futures[future], future.result())
+        return self.rows()
+
+    def rows(self):
+        """
+        The results of the finished points as a tidy table: one row per point, replicate, \n
+        year and species, with one column per swept parameter named 'name.parameter', e.g. \n
+        'Herbivore.beta', and the columns 'point', 'replicate', 'year', 'species' and 'count' \n
+        :return: list of dictionaries \n
+        """
+        rows = []
+        for index, (point, counts) in enumerate(zip(self.points, self.results)):
+            if counts is None:
+                continue
+            columns = {'{}.{}'.format(*key): point.get(key) for key in self.parameter_names}
+            for species, replicates in counts.items():
+                for replicate, yearly in enumerate(replicates):
+                    for year, count in enumerate(yearly, start=1):
+                        rows.append(dict(columns, point=index, replicate=replicate, year=year,
+                                         species=species, count=int(count)))
+        return rows
+
+    def table(self):
+        """
+        The results table as a pandas DataFrame, see rows \n
+        :return: DataFrame \n
+        """
+        import pandas as pd
+        return pd.DataFrame(self.rows())
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for methods in array_island.py
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import pytest
+import numpy as np
+from biosim.array_island import ArrayIsland
+from biosim.island import Island
+from biosim.landscape import Highland
+from biosim.simulation import BioSim
+
+
+class TestArrayIsland:
+    @pytest.fixture
+    def island(self):
+        map_str = """   WWWWW
+                        WLHDW
+                        WWWWW"""
+        return ArrayIsland(map_str)
+
+    @pytest.fixture
+    def population(self):
+        return [{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": 10, "weight": 20.0}
+                                        for _ in range(20)] +
+                                       [{"species": "Carnivore", "age": 5, "weight": 30.0}
+                                        for _ in range(5)]},
+                {"loc": (2, 3), "pop": [{"species": "Herbivore", "age": 10, "weight": 20.0}
+                                        for _ in range(2)]}]
+
+    def test_add_animals(self, island, population):
+        """
+        Tests that the animals are counted per species and per cell after being added
+        """
+        island.add_animals(population)
+        assert island.number_of_animals_per_species('Herbivore') == 22
+        assert island.number_of_animals_per_species('Carnivore') == 5
+        assert island.count_map('Herbivore')[1, 1] == 20
+        assert island.count_map('Herbivore')[1, 2] == 2
+
+    def test_valueerror_when_placed_in_water(self, island):
+        """
+        Testing that animals cannot be placed in water
+        """
+        with pytest.raises(ValueError):
+            island.add_animals([{"loc": (1, 1), "pop": [{"species": "Herbivore", "age": 10,
+                                                         "weight": 10.0}]}])
+
+    def test_valueerror_for_negative_weight(self, island):
+        """
+        Testing that animals cannot be added with negative weight
+        """
+        with pytest.raises(ValueError):
+            island.add_animals([{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": 10,
+                                                         "weight": -10.0}]}])
+
+    def test_workers_are_rejected(self):
+        """
+        Testing that the array engine refuses a worker pool it would not use
+        """
+        with pytest.raises(ValueError):
+            ArrayIsland("WWW\nWLW\nWWW", workers=2)
+
+    def test_occupied_cells_without_landscape_objects(self, island, population):
+        """
+        Testing that no landscape objects are built and that the occupied cells are read \n
+        from the counters
+        """
+        island.add_animals(population)
+        assert not hasattr(island, '_cells')
+        assert island.occupied_cells == [(1, 1), (1, 2)]
+
+    def test_arrays_grow_beyond_capacity(self, population):
+        """
+        Tests that more animals than the initial capacity can be stored
+        """
+        island = ArrayIsland("WWW\nWLW\nWWW", capacity=2)
+        island.add_animals(population[:1])
+        assert island.number_of_animals_per_species('Herbivore') == 20
+
+    def test_snapshot_matches_object_island(self, island, population):
+        """
+        Tests that the snapshot of the array island equals the snapshot of the object island \n
+        for the same population
+        """
+        object_island = Island(island.map)
+        island.add_animals(population)
+        object_island.add_animals(population)
+        snapshot, expected = island.snapshot(), object_island.snapshot()
+        for species in island.species_codes:
+            assert snapshot.counts[species].tolist() == expected.counts[species].tolist()
+            assert sorted(snapshot.weight[species]) == sorted(expected.weight[species])
+            assert sorted(snapshot.fitness[species]) == pytest.approx(
+                sorted(expected.fitness[species]))
+
+    def test_remaining_food_for_herbs_is_correctly_calculated(self, island, population):
+        """
+        Two herbivores in the highland eat F each
+        """
+        island.add_animals(population[1:])
+        island.update_fodder()
+        island.herbivore_eats()
+        f_max = Highland.parameters['f_max']
+        expected = f_max - 2 * island.fauna_dict_island['Herbivore'].parameters['F']
+        assert island._fodder[island.map_dims[1] + 2] == max(expected, 0)
+
+    def test_carnivores_eat_herbivores(self, island, population, mocker):
+        """
+        Tests that the herbivores are eaten and the carnivores gain weight when every kill \n
+        attempt succeeds
+        """
+        island.rng = mocker.Mock()
+        island.rng.random.side_effect = np.zeros
+        island.add_animals(population)
+        weight_before = island.animal_values('weight')['Carnivore']
+        island.carnivore_eats()
+        assert island.count_map('Herbivore')[1, 1] < 20
+        assert sum(island.animal_values('weight')['Carnivore']) > sum(weight_before)
+
+    def test_animals_age_and_lose_weight(self, island, population):
+        """
+        Tests that all animals age by one year and lose weight
+        """
+        island.add_animals(population)
+        island.update_animal_weight_and_age()
+        assert set(island.animal_values('age')['Herbivore']) == {11}
+        assert max(island.animal_values('weight')['Herbivore']) < 20
+
+    def test_animals_never_migrate_into_water(self, island, population):
+        """
+        Tests that animals only end up in land cells after migrating
+        """
+        island.add_animals(population)
+        for _ in range(10):
+            island.migration()
+        water = island.island_map == 'W'
+        assert island.count_map('Herbivore')[water].sum() == 0
+        assert island.count_map('Carnivore')[water].sum() == 0
+
+    def test_same_dynamics_as_object_island(self):
+        """
+        Compares the mean herbivore population on a single lowland cell after 30 years with \n
+        the object based island
+        """
+        population = [{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0}
+                                              for _ in range(50)]}]
+        counts = {}
+        for engine in (Island, ArrayIsland):
+            counts[engine] = []
+            for seed in range(5):
+                island = engine("WWW\nWLW\nWWW", rng=np.random.default_rng(seed))
+                island.add_animals(population)
+                for _ in range(30):
+                    island.life_cycle_in_rossumoya()
+                counts[engine].append(island.number_of_animals_per_species('Herbivore'))
+        assert np.mean(counts[ArrayIsland]) == pytest.approx(np.mean(counts[Island]), rel=0.2)
+
+    def test_biosim_with_array_engine(self, population):
+        """
+        Tests that BioSim can simulate with the array engine
+        """
+        sim = BioSim(island_map="WWWWW\nWLHDW\nWWWWW", ini_pop=population, seed=1,
+                     engine='array')
+        sim.simulate(num_years=5, vis_years=100, img_years=100)
+        assert sim.year == 5
+        assert sim.animal_distribution['Herbivore'].sum() == \
+            sim.num_animals_per_species['Herbivore']
+
+    def test_unknown_engine(self):
+        """
+        Tests that an unknown engine raises a ValueError
+        """
+        with pytest.raises(ValueError):
+            BioSim(island_map="WWW\nWLW\nWWW", ini_pop=[], seed=1, engine='gpu')
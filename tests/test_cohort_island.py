@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for methods in cohort_island.py
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import textwrap
+import pytest
+import numpy as np
+from biosim.cohort_island import CohortIsland
+from biosim.simulation import BioSim
+
+# The island of examples/check_sim.py
+CHECK_SIM_MAP = textwrap.dedent("""\
+    WWWWWWWWWWWWWWWWWWWWW
+    WWWWWWWWHWWWWLLLLLLLW
+    WHHHHHLLLLWWLLLLLLLWW
+    WHHHHHHHHHWWLLLLLLWWW
+    WHHHHHLLLLLLLLLLLLWWW
+    WHHHHHLLLDDLLLHLLLWWW
+    WHHLLLLLDDDLLLHHHHWWW
+    WWHHHHLLLDDLLLHWWWWWW
+    WHHHLLLLLDDLLLLLLLWWW
+    WHHHHLLLLDDLLLLWWWWWW
+    WWHHHHLLLLLLLLWWWWWWW
+    WWWHHHHLLLLLLLWWWWWWW
+    WWWWWWWWWWWWWWWWWWWWW""")
+
+
+class TestCohortIsland:
+    @pytest.fixture
+    def island(self):
+        map_str = """   WWWWW
+                        WLHDW
+                        WWWWW"""
+        return CohortIsland(map_str, rng=np.random.default_rng(1), debug=True)
+
+    @pytest.fixture
+    def population(self):
+        return [{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": 10, "weight": 20.0}
+                                        for _ in range(20)] +
+                                       [{"species": "Carnivore", "age": 5, "weight": 30.0}
+                                        for _ in range(5)]},
+                {"loc": (2, 3), "pop": [{"species": "Herbivore", "age": 10, "weight": 20.0}
+                                        for _ in range(2)]}]
+
+    def test_animals_are_merged_into_cohorts(self, island, population):
+        """
+        Tests that animals of the same species, cell, age and weight share one cohort, and \n
+        that they are counted per species and per cell
+        """
+        island.add_animals(population)
+        assert island.num_cohorts == 3
+        assert island.number_of_animals_per_species('Herbivore') == 22
+        assert island.number_of_animals_per_species('Carnivore') == 5
+        assert island.count_map('Herbivore')[1, 1] == 20
+        assert island.count_map('Herbivore')[1, 2] == 2
+        island.check_counters()
+
+    def test_valueerror_when_placed_in_water(self, island):
+        """
+        Testing that animals cannot be placed in water
+        """
+        with pytest.raises(ValueError):
+            island.add_animals([{"loc": (1, 1), "pop": [{"species": "Herbivore", "age": 10,
+                                                         "weight": 10.0}]}])
+
+    def test_weights_are_rounded_without_bias(self, island):
+        """
+        Tests that weights between two grid points are split between them so that the mean \n
+        weight is kept
+        """
+        island.add_animals([{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": 1,
+                                                     "weight": 20.2}] * 10000}])
+        weights = island.animal_values('weight')['Herbivore']
+        assert set(weights.tolist()) == {20.0, 20.5}
+        assert weights.mean() == pytest.approx(20.2, abs=0.02)
+
+    def test_herbivores_eat_all_fodder(self, island):
+        """
+        Tests that herbivores in a cell with too little fodder eat all of it, and that exactly \n
+        floor(fodder / F) of them eat F
+        """
+        island.add_animals([{"loc": (2, 3), "pop": [{"species": "Herbivore", "age": 1,
+                                                     "weight": 20.0}] * 40}])
+        island.update_fodder()
+        island.herbivore_eats()
+        fodder = island.landscape_dict['H'].parameters['f_max']
+        assert island._fodder[island.map_dims[1] + 2] == 0
+        weights = island.animal_values('weight')['Herbivore']
+        assert np.sum(weights - 20) == pytest.approx(0.9 * fodder)
+        assert np.sum(weights == 29) == fodder // 10
+
+    def test_migration_keeps_animals_on_land(self, island, population):
+        """
+        Tests that migration neither creates nor removes animals, and never moves them into \n
+        water
+        """
+        island.add_animals(population)
+        for _ in range(5):
+            island.migration()
+        assert island.number_of_animals_per_species('Herbivore') == 22
+        assert island.number_of_animals_per_species('Carnivore') == 5
+        land = (island.island_map != 'W').ravel()
+        assert np.all(land[island._cell])
+
+    def test_checkpoint_round_trip(self, island, population):
+        """
+        Tests that an island restored from its state continues exactly like the original
+        """
+        island.add_animals(population)
+        island.life_cycle_in_rossumoya()
+        arrays, state = island.get_state()
+        copy = CohortIsland(island.map, rng=np.random.default_rng(99))
+        copy.set_state(arrays, state)
+        for _ in range(5):
+            island.life_cycle_in_rossumoya()
+            copy.life_cycle_in_rossumoya()
+        assert copy.count_map('Herbivore').tolist() == island.count_map('Herbivore').tolist()
+        assert copy.num_cohorts == island.num_cohorts
+
+    def test_biosim_with_cohort_engine(self, population):
+        """
+        Tests that BioSim runs with the cohort engine
+        """
+        sim = BioSim("WWWWW\nWLHDW\nWWWWW", population, seed=1, engine='cohort')
+        sim.simulate(num_years=10, vis_years=None)
+        assert sim.num_animals == sum(sim.num_animals_per_species.values())
+
+    def test_snapshot_holds_one_value_per_cohort(self, island, population):
+        """
+        Tests that the snapshot holds one value and one animal count per cohort, and that \n
+        animal_values repeats them once per animal
+        """
+        island.add_animals(population)
+        snapshot = island.snapshot()
+        assert snapshot.weight['Herbivore'].tolist() == [20.0, 20.0]
+        assert snapshot.repeats['Herbivore'].tolist() == [20, 2]
+        assert snapshot.repeats['Carnivore'].sum() == 5
+        assert island.animal_values('age')['Herbivore'].tolist() == [10] * 22
+
+    def test_biosim_passes_the_weight_step(self, population):
+        """
+        Tests that BioSim hands weight_step to the cohort engine, and that the animal \n
+        properties hold one value per animal
+        """
+        sim = BioSim("WWWWW\nWLHDW\nWWWWW", population, seed=1, engine='cohort',
+                     weight_step=2)
+        assert sim._map.weight_step == 2
+        assert len(sim.animal_weights['Herbivore']) == 22
+        assert set(sim.animal_weights['Carnivore'].tolist()) == {30.0}
+
+
+def test_validation_against_individual_based_model():
+    """
+    Validates the cohort engine against the individual based array engine on the island of \n
+    check_sim.py. 150 herbivores grow for 40 years and 40 carnivores are added in year 20. \n
+    The mean counts over a few replicates must agree within 20 % for herbivores, and within \n
+    35 % for carnivores, whose hunt is only approximated by the cohort engine
+    """
+    herbivores = [{'loc': (10, 10), 'pop': [{'species': 'Herbivore', 'age': 5,
+                                             'weight': 20}] * 150}]
+    carnivores = [{'loc': (10, 10), 'pop': [{'species': 'Carnivore', 'age': 5,
+                                             'weight': 20}] * 40}]
+    means = {}
+    for engine in ('array', 'cohort'):
+        counts = []
+        for seed in range(3):
+            sim = BioSim(CHECK_SIM_MAP, herbivores, seed=seed, engine=engine)
+            sim.simulate(num_years=20, vis_years=None)
+            sim.add_population(carnivores)
+            sim.simulate(num_years=20, vis_years=None)
+            counts.append([sim.num_animals_per_species['Herbivore'],
+                           sim.num_animals_per_species['Carnivore']])
+        means[engine] = np.mean(counts, axis=0)
+    assert means['cohort'][0] == pytest.approx(means['array'][0], rel=0.2)
+    assert means['cohort'][1] == pytest.approx(means['array'][1], rel=0.35)
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for methods in ensemble.py
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import pytest
+import numpy as np
+from biosim.ensemble import Ensemble, StreamingQuantile
+
+MAP = """\
+WWWW
+WLHW
+WWWW"""
+
+POPULATION = [{'loc': (2, 2),
+               'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 20} for _ in range(20)] +
+                      [{'species': 'Carnivore', 'age': 5, 'weight': 20} for _ in range(3)]}]
+
+
+class TestStreamingQuantile:
+    def test_exact_for_few_observations(self):
+        """
+        Tests that the estimate is exact while at most five observations have been added
+        """
+        quantile = StreamingQuantile(0.5, (2,))
+        for value in ([1, 10], [3, 30], [2, 20]):
+            quantile.add(np.array(value, dtype=float))
+        assert quantile.value.tolist() == [2, 20]
+
+    @pytest.mark.parametrize('probability', [0.1, 0.5, 0.9])
+    def test_close_to_numpy_quantile(self, probability):
+        """
+        Tests that the estimate for many observations is close to the exact quantile
+        """
+        values = np.random.default_rng(1).normal(size=(2000, 3))
+        quantile = StreamingQuantile(probability, (3,))
+        for value in values:
+            quantile.add(value)
+        assert quantile.value == pytest.approx(np.quantile(values, probability, axis=0),
+                                               abs=0.1)
+
+
+class TestEnsemble:
+    def test_replicates_are_independent_and_reproducible(self):
+        """
+        Tests that the replicates differ from each other, and that the same seed gives the \n
+        same replicates
+        """
+        first = [counts for _, counts in Ensemble(MAP, POPULATION, 4, seed=1).replicates(10)]
+        second = [counts for _, counts in Ensemble(MAP, POPULATION, 4, seed=1).replicates(10)]
+        herbivores = [counts['Herbivore'].tolist() for counts in first]
+        assert herbivores == [counts['Herbivore'].tolist() for counts in second]
+        assert len(set(map(tuple, herbivores))) > 1
+
+    def test_summary_matches_replicates(self):
+        """
+        Tests that the mean and the extinction probability equal the values calculated from \n
+        all replicates
+        """
+        ensemble = Ensemble(MAP, POPULATION, 6, seed=2, quantiles=(0.5,))
+        counts = [replicate for _, replicate in ensemble.replicates(15)]
+        summary = ensemble.summary()
+        for species in ('Herbivore', 'Carnivore'):
+            history = np.array([replicate[species] for replicate in counts])
+            assert summary[species]['mean'] == pytest.approx(history.mean(axis=0))
+            assert summary[species]['extinction_probability'].tolist() == \
+                (history == 0).mean(axis=0).tolist()
+            assert np.all(summary[species][0.5] >= history.min(axis=0))
+            assert np.all(summary[species][0.5] <= history.max(axis=0))
+
+    def test_process_pool_gives_same_summary(self):
+        """
+        Tests that running the replicates in worker processes gives the same aggregates
+        """
+        serial = Ensemble(MAP, POPULATION, 3, seed=3).run(5)
+        parallel = Ensemble(MAP, POPULATION, 3, seed=3, workers=2).run(5)
+        for species in serial:
+            for key in serial[species]:
+                assert serial[species][key].tolist() == parallel[species][key].tolist()
+
+    def test_repeated_runs_give_same_summary(self):
+        """
+        Tests that running the same ensemble twice gives the same aggregates, and that they \n
+        still equal the aggregates of worker processes
+        """
+        ensemble = Ensemble(MAP, POPULATION, 3, seed=4)
+        first = ensemble.run(5)
+        second = ensemble.run(5)
+        parallel = Ensemble(MAP, POPULATION, 3, seed=4, workers=2).run(5)
+        for species in first:
+            for key in first[species]:
+                assert first[species][key].tolist() == second[species][key].tolist()
+                assert second[species][key].tolist() == parallel[species][key].tolist()
@@ -6,9 +6,12 @@ Unit tests for methods in fauna.py
 __author__ = "Ashesh Raj Gnawali, Maritn Bø"
 __email__ = "asgn@nmbu.no & mabo@nmbu.no"
 
+import pickle
 import pytest
 from biosim.fauna import Herbivore, Carnivore
+from biosim.parameters import parameter_class
 import math
+import numpy as np
 import scipy.stats as stats
 from scipy.stats import binom_test
 
@@ -27,13 +30,13 @@ class TestFauna:
         self.herb_young = Herbivore(10, 20)
         self.herb_old = Herbivore(50, 20)
         self.herb_no_weight = Herbivore(20, 0)
-        self.herb = Herbivore()
+        self.herb = Herbivore(rng=np.random.default_rng(1))
 
         self.carn_small = Carnivore(5, 20)
         self.carn_large = Carnivore(5, 50)
         self.carn_young = Carnivore(10, 20)
         self.carn_old = Carnivore(50, 20)
-        self.carn = Carnivore()
+        self.carn = Carnivore(rng=np.random.default_rng(2))
 
     def test_animal_weight(self):
         """
@@ -72,6 +75,64 @@ class TestFauna:
         assert self.herb_young.animal_fitness > self.herb_old.animal_fitness
         assert self.carn_young.animal_fitness > self.carn_old.animal_fitness
 
+    def test_fitness_is_cached_until_weight_changes(self):
+        """
+        Tests that the fitness is cached after it is read and recalculated when the weight \n
+        or age of the animal changes \n
+        """
+        fitness = self.herb_small.animal_fitness
+        assert self.herb_small.fitness == fitness
+        self.herb_small.animal_weight_with_food(10)
+        assert self.herb_small.fitness is None
+        assert self.herb_small.animal_fitness > fitness
+        self.herb_small.animal_weight_with_age()
+        assert self.herb_small.fitness is None
+
+    def test_fitness_array_equals_fitness(self):
+        """
+        Tests that the vectorized fitness gives the same values as the fitness of each animal \n
+        """
+        animals = [self.herb_small, self.herb_large, self.herb_old, self.herb_no_weight]
+        ages = np.array([animal.age for animal in animals])
+        weights = np.array([animal.weight for animal in animals])
+        assert Herbivore.fitness_array(ages, weights) == pytest.approx(
+            [animal.animal_fitness for animal in animals])
+
+    def test_animals_have_no_instance_dict(self):
+        """
+        Tests that the animals use slots and cannot get new attributes \n
+        """
+        assert not hasattr(self.herb_small, '__dict__')
+        with pytest.raises(AttributeError):
+            self.carn_small.unknown = 1
+
+    def test_frozen_parameters_follow_set_parameters(self):
+        """
+        Tests that the frozen parameters are rebuilt when the parameters are set, and that \n
+        they cannot be changed directly \n
+        """
+        old_gamma = Herbivore.parameters['gamma']
+        Herbivore.set_parameters({'gamma': 0.5})
+        assert Herbivore.params.gamma == 0.5
+        Herbivore.set_parameters({'gamma': old_gamma})
+        assert Herbivore.params.gamma == old_gamma
+        with pytest.raises(AttributeError):
+            Herbivore.params.gamma = 1
+
+    def test_set_parameters_invalidates_cached_fitness(self):
+        """
+        Tests that the cached fitness of an existing animal is recalculated after the \n
+        parameters of its species change, and survives pickling \n
+        """
+        species = parameter_class(Herbivore)
+        animal = species(10, 20)
+        old_fitness = animal.animal_fitness
+        species.set_parameters({'w_half': 40})
+        assert animal.fitness is None
+        new_fitness = animal.animal_fitness
+        assert new_fitness < old_fitness
+        assert pickle.loads(pickle.dumps(animal)).fitness == new_fitness
+
     def test_weight_increases_after_eating(self):
         """
         Tests if the weight of an animal that has eaten is larger than the weight \n
@@ -87,15 +148,17 @@ class TestFauna:
         Testing probability of birth returns False when only \n
         one animal is present \n
         """
-        assert self.herb_small.proba_animal_birth(1) is False
-        assert self.carn_young.proba_animal_birth(1) is False
+        rng = np.random.default_rng(3)
+        assert self.herb_small.proba_animal_birth(1, rng) is False
+        assert self.carn_young.proba_animal_birth(1, rng) is False
 
     def test_probability_of_birth_for_more_than_two_animal(self):
         """
         Checks the probability of birth when more than 2 animals exists \n
         """
-        assert self.herb_small.proba_animal_birth(20) is False
-        assert self.carn_young.proba_animal_birth(10) is False
+        rng = np.random.default_rng(4)
+        assert self.herb_small.proba_animal_birth(20, rng) is False
+        assert self.carn_young.proba_animal_birth(10, rng) is False
 
     def test_age_increases_by_one_per_year(self):
         """
@@ -122,24 +185,26 @@ class TestFauna:
         test that animal dies when it's weight/fitness is 0 \n
         """
         self.herb.weight = 0
-        assert self.herb.death_probability is True
+        assert self.herb.death_probability(np.random.default_rng(5)) is True
 
     def test_animal_migration_chances(self, mocker):
         """
         test that the bool of migration is False if \n
         weight/ fitness is zero \n
         """
-        mocker.patch('numpy.random.uniform', return_value=0)
+        rng = mocker.Mock()
+        rng.random.return_value = 0
         self.carn_young.weight = 0
-        assert self.carn_young.animal_moves_bool is False
+        assert self.carn_young.animal_moves_bool(rng) is False
 
     def test_animal_migration_chances_for_fit_animal(self, mocker):
         """
         test the probability of migration is True if \n
         fitness is high \n
         """
-        mocker.patch('numpy.random.uniform', return_value=0)
-        assert self.herb_young.animal_moves_bool
+        rng = mocker.Mock()
+        rng.random.return_value = 0
+        assert self.herb_young.animal_moves_bool(rng)
 
     def test_carnivore_kills(self, mocker):
         """
@@ -149,6 +214,30 @@ class TestFauna:
         mocker.patch('numpy.random.uniform', return_value=0)
         assert self.carn_young.probability_of_killing(self.herb_old)
 
+    def test_hunt_stops_when_appetite_is_met(self, mocker):
+        """
+        Tests that a carnivore only kills one heavy herbivore when every kill attempt \n
+        succeeds, and that it eats exactly its appetite F \n
+        """
+        rng = mocker.Mock()
+        rng.random.side_effect = np.zeros
+        appetite = Carnivore.parameters['F']
+        food_eaten, killed = Carnivore.hunt(np.array([5.]), np.array([50.]),
+                                            np.array([0.1, 0.2, 0.3]),
+                                            np.full(3, appetite + 10.), rng)
+        assert food_eaten[0] == appetite
+        assert killed.tolist() == [True, False, False]
+
+    def test_hunt_never_kills_fitter_herbivores(self):
+        """
+        Tests that no herbivore is killed when all herbivores are fitter than the carnivores \n
+        """
+        food_eaten, killed = Carnivore.hunt(np.array([50., 60.]), np.array([1., 1.]),
+                                            np.full(10, 0.99), np.full(10, 20.),
+                                            np.random.default_rng(1))
+        assert not killed.any()
+        assert not food_eaten.any()
+
     def test_valueerror_for_negative_age(self):
         """
         Tests if valueerror is being raised when a negative age is set as input
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for methods in graphics.py
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import pytest
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from biosim.graphics import Graphics
+
+
+class TestGraphics:
+    @pytest.fixture
+    def vis(self):
+        fig = plt.figure(figsize=(8, 4.5))
+        vis = Graphics("WWW\nWLW\nWWW", fig, (3, 3))
+        vis.create_histograms_setup({'weight': {'max': 10, 'delta': 2}})
+        yield vis
+        plt.close(fig)
+
+    def test_histograms_follow_hist_specs(self, vis):
+        """
+        Tests that only the histograms in hist_specs are created, with the given bins
+        """
+        assert list(vis.histograms) == ['weight']
+        assert vis.fit_ax is None
+        assert vis.histograms['weight'][1].tolist() == [0, 2, 4, 6, 8, 10]
+
+    def test_histogram_heights_are_updated_in_place(self, vis):
+        """
+        Tests that the step artists get the counts of np.histogram and that the y axis grows
+        """
+        steps = vis.histograms['weight'][2]
+        weights = {'Herbivore': np.array([1., 1., 3., 9.]), 'Carnivore': np.array([5.])}
+        vis.update_histogram(wt_list=weights)
+        assert vis.histograms['weight'][2] is steps
+        assert steps['Herbivore'].get_data().values.tolist() == [2, 1, 0, 0, 1]
+        assert steps['Carnivore'].get_data().values.tolist() == [0, 0, 1, 0, 0]
+        assert vis.wt_ax.get_ylim()[1] >= 2
+
+    def test_histogram_counts_repeated_values(self, vis):
+        """
+        Tests that the number of animals per value is used as histogram weights
+        """
+        weights = {'Herbivore': np.array([1., 9.]), 'Carnivore': np.array([5.])}
+        repeats = {'Herbivore': np.array([30, 2]), 'Carnivore': np.array([4])}
+        vis.update_histogram(wt_list=weights, repeats=repeats)
+        steps = vis.histograms['weight'][2]
+        assert steps['Herbivore'].get_data().values.tolist() == [30, 0, 0, 0, 2]
+        assert steps['Carnivore'].get_data().values.tolist() == [0, 0, 4, 0, 0]
+        assert vis.wt_ax.get_ylim()[1] >= 30
+
+    def test_refresh_only_redraws_the_background_when_needed(self, vis, mocker):
+        """
+        Tests that the whole figure is drawn on the first refresh, and only the animated \n
+        artists after that
+        """
+        draw = mocker.spy(vis.fig.canvas, 'draw')
+        vis.set_year(0)
+        vis.refresh()
+        vis.set_year(1)
+        vis.refresh()
+        assert draw.call_count == 1
+        with vis.all_artists_drawn():
+            assert not any(artist.get_animated() for artist in vis._animated)
+        vis.refresh()
+        assert draw.call_count == 2
@@ -7,6 +7,7 @@ __author__ = "Ashesh Raj Gnawali, Martin Bø"
 __email__ = "asgn@nmbu.no & mabo@nmbu.no"
 
 import pytest
+import numpy as np
 from biosim.island import *
 from biosim.landscape import Landscape, Lowland, Water, Highland, Desert
 
@@ -48,6 +49,21 @@ class TestIsland:
         for cells in island.adjacent_cells(0, 0):
             assert isinstance(cells, Water)
 
+    def test_neighbour_index(self):
+        """
+        Test that the neighbour index lists the neighbours of a cell in the order up, down, \n
+        left, right and leaves out cells outside the map
+        """
+        map_str = """   WWW
+                        WLW
+                        WWW"""
+        island = Island(map_str)
+        centre = island.neighbour_ids[island.neighbour_ptr[4]:island.neighbour_ptr[5]]
+        corner = island.neighbour_ids[island.neighbour_ptr[0]:island.neighbour_ptr[1]]
+        assert centre.tolist() == [1, 7, 3, 5]
+        assert corner.tolist() == [3, 1]
+        assert island.migratable.tolist() == [False] * 4 + [True] + [False] * 4
+
     def test_check_surrounded_by_water(self):
         """
         Testing if value error is raised when edges dont contain water cells
@@ -80,6 +96,25 @@ class TestIsland:
         assert island.number_of_animals_per_species('Herbivore') == 3
         assert island.number_of_animals_per_species('Carnivore') == 2
 
+    def test_occupied_cells_follow_the_animals(self):
+        """
+        Testing that the occupied cells are exactly the cells that hold animals, after adding \n
+        animals and after some years of migration and death
+        """
+        map_str = """   WWWWWW
+                        WLLLLW
+                        WLHHLW
+                        WWWWWW"""
+        island = Island(map_str, rng=np.random.default_rng(5))
+        island.add_animals([{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": 5,
+                                                     "weight": 20.0} for _ in range(20)]}])
+        assert island.occupied_cells == [(1, 1)]
+        for _ in range(5):
+            island.life_cycle_in_rossumoya()
+            holding_animals = [(row, col) for row in range(4) for col in range(6)
+                               if island.cells[row, col].fauna_dict['Herbivore']]
+            assert island.occupied_cells == holding_animals
+
     def test_valueerror_when_placed_in_water(self):
         """
         Testing add_animals and total_animals_per_species methods in the island class
@@ -95,3 +130,75 @@ class TestIsland:
         with pytest.raises(ValueError) as err:
             island.add_animals(animals)
             assert err.type is ValueError
+
+    @pytest.mark.parametrize('workers, pool', [(2, 'thread'), (2, 'process')])
+    def test_parallel_life_cycle_gives_same_result(self, workers, pool):
+        """
+        Testing that the result of the life cycle does not depend on the number of workers, \n
+        since every cell draws from its own random stream
+        """
+        map_str = """   WWWWW
+                        WLLHW
+                        WDLLW
+                        WWWWW"""
+        animals = [{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": 5, "weight": 20.0}
+                                           for _ in range(30)] +
+                                          [{"species": "Carnivore", "age": 5, "weight": 20.0}
+                                           for _ in range(5)]}]
+        weights = []
+        for island_workers, island_pool in ((None, 'process'), (workers, pool)):
+            island = Island(map_str, rng=np.random.default_rng(3), workers=island_workers,
+                            pool=island_pool, debug=True)
+            island.add_animals(animals)
+            for _ in range(5):
+                island.life_cycle_in_rossumoya()
+            island.close()
+            weights.append(island.animal_values('weight'))
+        for species in weights[0]:
+            assert weights[0][species].tolist() == weights[1][species].tolist()
+
+    def test_cell_streams_are_keyed_by_cell_index(self):
+        """
+        Testing that every land cell draws from the stream rng.spawn would give it, that the \n
+        island does not spawn from its generator, and that water cells get no generator
+        """
+        rng = np.random.default_rng(7)
+        island = Island("WWWW\nWLHW\nWWWW", rng=rng)
+        assert rng.bit_generator.seed_seq.n_children_spawned == 0
+        spawned = np.random.default_rng(7).spawn(12)
+        for cell_id in (5, 6):
+            assert island.cells.flat[cell_id].rng.random(3).tolist() == \
+                spawned[cell_id].random(3).tolist()
+        assert island.cells[0, 0]._rng is None
+
+    def test_snapshot(self):
+        """
+        Testing that the snapshot holds the counts per cell and one age, weight and fitness \n
+        value per animal
+        """
+        island = Island("WWWW\nWLHW\nWWWW")
+        island.add_animals([{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": 5,
+                                                     "weight": 20.0} for _ in range(3)]},
+                            {"loc": (2, 3), "pop": [{"species": "Carnivore", "age": 7,
+                                                     "weight": 30.0}]}])
+        snapshot = island.snapshot()
+        assert snapshot.counts['Herbivore'].tolist() == [[0, 0, 0, 0], [0, 3, 0, 0],
+                                                         [0, 0, 0, 0]]
+        assert snapshot.counts['Carnivore'][1, 2] == 1
+        assert snapshot.age['Herbivore'].tolist() == [5, 5, 5]
+        assert snapshot.weight['Carnivore'].tolist() == [30.0]
+        assert snapshot.fitness['Herbivore'] == pytest.approx(
+            [island.cells[1, 1].fauna_dict['Herbivore'][0].animal_fitness] * 3)
+
+    def test_check_counters_finds_untracked_animals(self):
+        """
+        Testing that the debug check raises when an animal is added behind the back of the \n
+        island
+        """
+        island = Island("WWWW\nWLHW\nWWWW")
+        island.add_animals([{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": 5,
+                                                     "weight": 20.0}]}])
+        island.check_counters()
+        island.cells[1, 2].add_animal(Herbivore(5, 20.0))
+        with pytest.raises(RuntimeError):
+            island.check_counters()
@@ -1,4 +1,5 @@
 import pytest
+import numpy as np
 
 from biosim.landscape import Lowland, Water, Highland, Desert
 from biosim.fauna import Herbivore, Carnivore
@@ -36,7 +37,7 @@ class TestLandscape:
         """
         lowland = landscape_data["L"]
         assert len(lowland.fauna_dict['Herbivore']) == 2
-        herb3 = Herbivore()
+        herb3 = Herbivore(rng=np.random.default_rng(1))
         lowland.add_animal(herb3)
         assert len(lowland.fauna_dict['Herbivore']) == 3
 
@@ -57,8 +58,9 @@ class TestLandscape:
         Tests if a carnivore eats a herbivore in the lowland by mocking the random.uniform \n
         function inside carnivore_eats. \n
         """
-        mocker.patch("numpy.random.uniform", return_value=0)
         lowland = landscape_data["L"]
+        lowland.rng = mocker.Mock()
+        lowland.rng.random.side_effect = np.zeros
         self.herb1 = lowland.fauna_dict["Herbivore"][0]
         self.carn1 = lowland.fauna_dict["Carnivore"][0]
         weight_before = self.carn1.weight
@@ -119,8 +121,9 @@ class TestLandscape:
         """
         Adds two herbivores and two carnivores and check if the herbivores gets eaten
         """""
-        mocker.patch("numpy.random.uniform", return_value=0)
         lowland = landscape_data["L"]
+        lowland.rng = mocker.Mock()
+        lowland.rng.random.side_effect = np.zeros
         self.herb1 = lowland.fauna_dict["Herbivore"][0]
         self.herb2 = lowland.fauna_dict["Herbivore"][1]
         self.carn1 = lowland.fauna_dict["Carnivore"][0]
@@ -131,8 +134,9 @@ class TestLandscape:
         assert lowland.cell_fauna_count["Herbivore"] == 0
 
     def test_animal_count_increases_when_animal_is_born(self, landscape_data, mocker):
-        mocker.patch("biosim.fauna.Fauna.proba_animal_birth", return_value=True)
         lowland = landscape_data["L"]
+        lowland.rng = mocker.Mock(wraps=np.random.default_rng(1))
+        lowland.rng.random.side_effect = np.zeros
         self.herb1 = lowland.fauna_dict["Herbivore"][0]
         self.herb2 = lowland.fauna_dict["Herbivore"][1]
         initial_count = lowland.cell_fauna_count["Herbivore"]
@@ -149,6 +153,31 @@ class TestLandscape:
         assert len(highland.fauna_dict['Herbivore']) == 2
         assert highland.food_left == 280
 
+    def test_update_fitness_fills_fitness_cache(self, landscape_data):
+        """
+        Tests that update_fitness stores the fitness of every animal in the cell \n
+        """
+        lowland = landscape_data['L']
+        lowland.update_fitness()
+        for animals in lowland.fauna_dict.values():
+            for animal in animals:
+                assert animal.fitness is not None
+
+    def test_update_fitness_keeps_valid_cache(self, landscape_data):
+        """
+        Tests that update_fitness only recalculates the fitness of animals whose age or \n
+        weight changed \n
+        """
+        lowland = landscape_data['L']
+        lowland.update_fitness()
+        changed, unchanged = lowland.fauna_dict['Herbivore'][:2]
+        changed.weight += 5
+        unchanged.fitness = 0.123
+        lowland.update_fitness()
+        assert unchanged.fitness == 0.123
+        assert changed.fitness == pytest.approx(changed.fitness_array(
+            np.array([changed.age]), np.array([changed.weight]))[0])
+
     def test_sort_by_fitness_herb(self, landscape_data):
         """
         Tests the sort by fitness function on herbivores \n
@@ -169,16 +198,60 @@ class TestLandscape:
         self.carn2 = lowland.fauna_dict['Carnivore'][1]
         assert self.carn1.animal_fitness > self.carn2.animal_fitness
 
+    def test_decide_migration_takes_movers_out_of_cell(self, landscape_data, mocker):
+        """
+        Tests that animals that decide to move are kept as emigrants and that apply_migration \n
+        moves them to the chosen neighbour, or back into the cell if the neighbour is water \n
+        """
+        lowland = landscape_data['L']
+        lowland.rng = mocker.Mock()
+        lowland.rng.random.side_effect = np.zeros
+        lowland.rng.integers.side_effect = lambda high, size: np.arange(size) % 2
+        lowland.decide_migration(2)
+        assert len(lowland.emigrants) == 4
+        assert lowland.cell_fauna_count == {'Herbivore': 0, 'Carnivore': 0}
+
+        neighbours = [Highland(), Water()]
+        lowland.apply_migration(neighbours)
+        assert sum(neighbours[0].cell_fauna_count.values()) == 2
+        assert sum(lowland.cell_fauna_count.values()) == 2
+        assert lowland.emigrants == []
+
     def test_no_birth_when_mother_loses_more_than_her_weight(self, landscape_data, mocker):
         """
         Test if animals still gives birth when setting the
         :return:
         """
-        mocker.patch("biosim.fauna.Fauna.weight_update_after_birth", return_value=False)
         lowland = landscape_data['L']
+        lowland.rng = mocker.Mock(wraps=np.random.default_rng(1))
+        lowland.rng.random.side_effect = np.zeros
+        lowland.rng.normal.side_effect = lambda mean, sigma, size: np.full(size, 1000.)
         animals_before = len(lowland.fauna_dict["Herbivore"])
+        weights_before = [animal.weight for animal in lowland.fauna_dict["Herbivore"]]
         lowland.animal_gives_birth()
         assert animals_before == len(lowland.fauna_dict["Herbivore"])
+        assert weights_before == [animal.weight for animal in lowland.fauna_dict["Herbivore"]]
+
+    def test_fused_ageing_and_death_matches_separate_phases(self, landscape_data):
+        """
+        Tests that animal_ages_and_dies gives the same survivors, ages, weights and fitness \n
+        as update_animal_weight_and_age followed by animal_dies with the same random numbers
+        """
+        separate, fused = Lowland(rng=np.random.default_rng(4)), Lowland(
+            rng=np.random.default_rng(4))
+        rng = np.random.default_rng(2)
+        for age, weight in zip(rng.integers(0, 60, 200).tolist(),
+                               rng.uniform(0, 40, 200).tolist()):
+            separate.add_animal(Herbivore(age, weight))
+            fused.add_animal(Herbivore(age, weight))
+        for _ in range(3):
+            separate.update_animal_weight_and_age()
+            separate.animal_dies()
+            fused.animal_ages_and_dies()
+        assert [(herb.age, herb.weight, herb.animal_fitness)
+                for herb in fused.fauna_dict["Herbivore"]] == \
+            [(herb.age, herb.weight, herb.animal_fitness)
+             for herb in separate.fauna_dict["Herbivore"]]
 
     class TestWater:
         @pytest.fixture
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for methods in movie.py
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import os
+import stat
+import sys
+import pytest
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from biosim.movie import MovieWriter
+from biosim.simulation import BioSim
+
+
+@pytest.fixture
+def fake_ffmpeg(tmp_path):
+    """
+    A stand-in for ffmpeg that reads all frames from stdin and writes the number of bytes it \n
+    received to the output file given as the last argument
+    """
+    script = tmp_path / 'fake_ffmpeg'
+    script.write_text('#!{}\n'
+                      'import sys\n'
+                      'data = sys.stdin.buffer.read()\n'
+                      'open(sys.argv[-1], "w").write(str(len(data)))\n'.format(sys.executable))
+    script.chmod(script.stat().st_mode | stat.S_IEXEC)
+    return str(script)
+
+
+def test_frames_are_piped_as_raw_rgb(tmp_path, fake_ffmpeg):
+    """
+    Tests that every frame reaches ffmpeg as width * height * 3 bytes
+    """
+    movie = os.path.join(str(tmp_path), 'movie.mp4')
+    writer = MovieWriter(movie, binary=fake_ffmpeg)
+    fig = plt.figure(figsize=(2, 1), dpi=50)
+    for _ in range(3):
+        writer.write_frame(fig)
+    writer.close()
+    plt.close(fig)
+    assert writer.frame_size == (100, 50)
+    with open(movie) as received:
+        assert int(received.read()) == 3 * 100 * 50 * 3
+
+
+def test_failing_ffmpeg_raises(tmp_path):
+    """
+    Tests that a failing ffmpeg is reported as a RuntimeError
+    """
+    writer = MovieWriter(os.path.join(str(tmp_path), 'movie.mp4'), binary='false')
+    fig = plt.figure(figsize=(1, 1), dpi=10)
+    with pytest.raises(RuntimeError):
+        writer.write_frame(fig)
+        writer.close()
+    plt.close(fig)
+
+
+def test_biosim_streams_movie(tmp_path, fake_ffmpeg, mocker):
+    """
+    Tests that BioSim pipes one frame per image year and writes no image files
+    """
+    mocker.patch('biosim.movie.FFMPEG_BINARY', fake_ffmpeg)
+    img_base = os.path.join(str(tmp_path), 'sim')
+    sim = BioSim("WWW\nWLW\nWWW", [], seed=1, img_base=img_base, stream_movie=True)
+    sim.simulate(num_years=4, vis_years=1)
+    frame_size = sim._movie.frame_size
+    sim.make_movie()
+    plt.close('all')
+    assert sorted(os.listdir(str(tmp_path))) == ['fake_ffmpeg', 'sim.mp4']
+    with open(img_base + '.mp4') as received:
+        assert int(received.read()) == 4 * frame_size[0] * frame_size[1] * 3
+
+
+def test_biosim_finishes_movie_when_a_year_raises(tmp_path, fake_ffmpeg, mocker):
+    """
+    Tests that simulate finishes the streamed movie and ffmpeg when a year raises
+    """
+    mocker.patch('biosim.movie.FFMPEG_BINARY', fake_ffmpeg)
+    img_base = os.path.join(str(tmp_path), 'sim')
+    sim = BioSim("WWW\nWLW\nWWW", [], seed=1, img_base=img_base, stream_movie=True)
+    sim.simulate(num_years=2, vis_years=1)
+    process = sim._movie._process
+    mocker.patch.object(sim, 'simulate_year', side_effect=ValueError)
+    with pytest.raises(ValueError):
+        sim.simulate(num_years=2, vis_years=1)
+    plt.close('all')
+    assert sim._movie is None
+    assert process.returncode == 0
+    assert os.path.exists(img_base + '.mp4')
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for methods in profiling.py
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import os
+import pstats
+import pytest
+from biosim.profiling import PhaseTimer
+from biosim.results import NpzResultsWriter, read_results
+from biosim.simulation import BioSim
+
+MAP = """\
+WWWWW
+WLLHW
+WLDLW
+WWWWW"""
+
+POPULATION = [{'loc': (2, 2),
+               'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 20} for _ in range(40)] +
+                      [{'species': 'Carnivore', 'age': 5, 'weight': 20} for _ in range(10)]}]
+
+
+def test_timer_adds_years_to_totals():
+    """
+    Tests that end_year returns the rows of the year and adds them to the report
+    """
+    timer = PhaseTimer()
+    timer.record('animal_eats', 'Lowland', 0.5, 10)
+    timer.record('animal_eats', 'Highland', 0.25, 4)
+    rows = timer.end_year()
+    timer.record('animal_eats', 'Lowland', 0.5, 6)
+    assert len(timer.end_year()) == 1
+    assert rows['animals'].tolist() == [10, 4]
+
+    report = timer.report()['animal_eats']
+    assert report['time'] == 1.25
+    assert report['calls'] == 3
+    assert report['landscapes']['Lowland'] == {'time': 1.0, 'calls': 2, 'animals': 16}
+
+
+@pytest.mark.parametrize('engine', ['object', 'array'])
+def test_timing_does_not_change_the_result(engine):
+    """
+    Tests that measuring the phases gives the same population, and that every phase is \n
+    in the report
+    """
+    timed = BioSim(MAP, POPULATION, seed=2, engine=engine, timing=True)
+    reference = BioSim(MAP, POPULATION, seed=2, engine=engine)
+    timed.simulate(num_years=5, vis_years=None)
+    reference.simulate(num_years=5, vis_years=None)
+    assert timed.num_animals_per_species == reference.num_animals_per_species
+
+    report = timed.perf_report()
+    assert 'update_fodder' in report and 'animal_gives_birth' in report
+    assert all(phase['time'] >= 0 for phase in report.values())
+    if engine == 'object':
+        assert set(report['animal_eats']['landscapes']) <= {'Lowland', 'Highland', 'Desert'}
+        assert report['apply_migration']['calls'] == 5
+        assert 'animal_ages_and_dies' in report
+    else:
+        assert 'animal_dies' in report
+        assert report['herbivore_eats']['landscapes']['Island']['calls'] == 5
+
+
+def test_perf_report_without_timing():
+    """
+    Tests that perf_report raises a RuntimeError if the phases are not measured
+    """
+    with pytest.raises(RuntimeError):
+        BioSim(MAP, POPULATION, seed=1).perf_report()
+
+
+def test_timings_are_written_to_results(tmp_path):
+    """
+    Tests that the timings of every stored year reach the npz files
+    """
+    path = os.path.join(str(tmp_path), 'counts')
+    sim = BioSim(MAP, POPULATION, seed=1, timing=True,
+                 results=NpzResultsWriter(path, every=2, batch_size=2))
+    sim.simulate(num_years=6, vis_years=None)
+    sim.results.close()
+    results = read_results(path)
+    assert sorted(set(results['timing_year'].tolist())) == [2, 4, 6]
+    assert len(results['timings']) == len(results['timing_year'])
+    assert 'animal_gives_birth' in results['timings']['phase'].tolist()
+
+
+def test_profiler_only_runs_in_given_years(mocker):
+    """
+    Tests that the profiler is enabled for the life cycle of the given years only, and that \n
+    cProfile is used by default
+    """
+    sim = BioSim(MAP, POPULATION, seed=1)
+    profiler = mocker.Mock()
+    sim.profile(range(3, 5), profiler)
+    sim.simulate(num_years=6, vis_years=None)
+    assert profiler.enable.call_count == 2
+    assert profiler.disable.call_count == 2
+
+    profiler = sim.profile(range(7, 8))
+    sim.simulate(num_years=2, vis_years=None)
+    stats = pstats.Stats(profiler)
+    assert any(function == 'life_cycle_in_rossumoya' for _, _, function in stats.stats)
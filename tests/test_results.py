@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for methods in results.py
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import os
+import pytest
+import numpy as np
+from biosim.results import NpzResultsWriter, read_results
+from biosim.simulation import BioSim
+
+
+class TestNpzResultsWriter:
+    @pytest.fixture
+    def path(self, tmp_path):
+        return os.path.join(str(tmp_path), 'counts')
+
+    def test_years_are_written_in_chunks(self, path):
+        """
+        Tests that the years are split into files of batch_size years and read back in order
+        """
+        writer = NpzResultsWriter(path, batch_size=3)
+        for year in range(1, 8):
+            writer.write(year, {'Herbivore': np.full((2, 3), year)})
+        writer.close()
+        assert len(os.listdir(os.path.dirname(path))) == 3
+        results = read_results(path)
+        assert results['year'].tolist() == list(range(1, 8))
+        assert results['Herbivore'].shape == (7, 2, 3)
+        assert results['Herbivore'][:, 0, 0].tolist() == list(range(1, 8))
+
+    def test_only_every_nth_year_is_stored(self, path):
+        """
+        Tests that the cadence given by every is followed
+        """
+        writer = NpzResultsWriter(path, every=5)
+        for year in range(1, 21):
+            writer.write(year, {'Herbivore': np.zeros((1, 1))})
+        writer.close()
+        assert read_results(path)['year'].tolist() == [5, 10, 15, 20]
+
+    def test_writer_errors_are_raised(self, tmp_path):
+        """
+        Tests that a failing write in the background thread is raised in the caller
+        """
+        writer = NpzResultsWriter(os.path.join(str(tmp_path), 'missing', 'counts'))
+        writer.write(1, {'Herbivore': np.zeros((1, 1))})
+        with pytest.raises(RuntimeError):
+            writer.flush()
+
+    def test_biosim_streams_counts(self, path):
+        """
+        Tests that BioSim hands the counts of every year to the results sink and that they \n
+        match the final animal distribution
+        """
+        population = [{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": 5, "weight": 20}
+                                              for _ in range(20)]}]
+        sim = BioSim(island_map="WWWW\nWLHW\nWWWW", ini_pop=population, seed=1,
+                     results=NpzResultsWriter(path, batch_size=4))
+        sim.simulate(num_years=10, vis_years=None)
+        results = read_results(path)
+        assert results['year'].tolist() == list(range(1, 11))
+        assert results['Herbivore'][-1].ravel().tolist() == \
+            sim.animal_distribution['Herbivore'].tolist()
+        sim.results.close()
+
+    def test_biosim_closes_the_writer(self, path, mocker):
+        """
+        Tests that simulate closes the writer when it ends and when a year raises, and that \n
+        a later simulate keeps writing after the writer was closed
+        """
+        population = [{"loc": (2, 2), "pop": [{"species": "Herbivore", "age": 5, "weight": 20}
+                                              for _ in range(10)]}]
+        sim = BioSim(island_map="WWWW\nWLHW\nWWWW", ini_pop=population, seed=1,
+                     results=NpzResultsWriter(path, batch_size=4))
+        sim.simulate(num_years=3, vis_years=None)
+        assert not sim.results._thread.is_alive()
+        sim.simulate(num_years=3, vis_years=None)
+        assert read_results(path)['year'].tolist() == list(range(1, 7))
+
+        close = mocker.spy(sim.results, 'close')
+        mocker.patch.object(sim._map, 'life_cycle_in_rossumoya', side_effect=ValueError)
+        with pytest.raises(ValueError):
+            sim.simulate(num_years=3, vis_years=None)
+        close.assert_called_once()
+        assert not sim.results._thread.is_alive()
+
+    def test_timing_writes_check_errors(self, tmp_path):
+        """
+        Tests that an error of the writer thread is also raised by write_timings
+        """
+        writer = NpzResultsWriter(os.path.join(str(tmp_path), 'missing', 'counts'),
+                                  batch_size=1)
+        writer.write(1, {'Herbivore': np.zeros((1, 1))})
+        writer._queue.join()
+        with pytest.raises(RuntimeError):
+            writer.write_timings(2, np.zeros(0))
+        writer.close()
@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for methods in simulation.py
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import os
+import subprocess
+import sys
+import threading
+import time
+import pytest
+import numpy as np
+from biosim.simulation import BioSim
+
+MAP = """\
+WWWWW
+WLLHW
+WLDLW
+WWWWW"""
+
+POPULATION = [{'loc': (2, 2),
+               'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 20} for _ in range(40)] +
+                      [{'species': 'Carnivore', 'age': 5, 'weight': 20} for _ in range(10)]}]
+
+
+def run_years(sim, num_years):
+    """
+    Runs the island life cycle without graphics and returns the yearly population counts
+    """
+    counts = []
+    for _ in range(num_years):
+        sim._map.life_cycle_in_rossumoya()
+        counts.append(tuple(sim.num_animals_per_species.values()))
+    return counts
+
+
+@pytest.mark.parametrize('engine', ['object', 'array'])
+def test_same_seed_gives_same_result(engine):
+    """
+    Tests that two simulations with the same seed give identical populations
+    """
+    first = BioSim(MAP, POPULATION, seed=42, engine=engine)
+    second = BioSim(MAP, POPULATION, seed=42, engine=engine)
+    assert run_years(first, 15) == run_years(second, 15)
+    for species, weights in first.animal_weights.items():
+        assert weights.tolist() == second.animal_weights[species].tolist()
+
+
+@pytest.mark.parametrize('engine', ['object', 'array'])
+def test_simulations_are_independent(engine):
+    """
+    Tests that running another simulation in between does not change the result, and that \n
+    the global numpy random state is not used
+    """
+    reference = run_years(BioSim(MAP, POPULATION, seed=7, engine=engine), 10)
+
+    sim = BioSim(MAP, POPULATION, seed=7, engine=engine)
+    other = BioSim(MAP, POPULATION, seed=8, engine=engine)
+    counts = []
+    for _ in range(10):
+        run_years(other, 1)
+        np.random.random(100)
+        counts.extend(run_years(sim, 1))
+    assert counts == reference
+
+
+@pytest.mark.parametrize('engine', ['object', 'array'])
+def test_counters_match_recount(engine):
+    """
+    Tests that the population counters agree with a full recount every year, and that \n
+    num_animals adds up all species
+    """
+    sim = BioSim(MAP, POPULATION, seed=3, engine=engine, debug=True)
+    run_years(sim, 20)
+    assert sim.num_animals == sum(sim.num_animals_per_species.values())
+    for species, count in sim.num_animals_per_species.items():
+        assert sim.snapshot().counts[species].sum() == count
+
+
+def test_headless_simulation_does_not_import_graphics():
+    """
+    Tests that a simulation with vis_years=None never imports matplotlib or pandas
+    """
+    code = ("import sys\n"
+            "from biosim.simulation import BioSim\n"
+            "sim = BioSim({!r}, {!r}, seed=1)\n"
+            "sim.simulate(num_years=5, vis_years=None)\n"
+            "assert sim.year == 5 and sim.vis is None\n"
+            "assert 'matplotlib' not in sys.modules and 'pandas' not in sys.modules\n"
+            ).format(MAP, POPULATION)
+    subprocess.run([sys.executable, '-c', code], check=True,
+                   cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def test_async_graphics_drops_frames_but_not_images(mocker):
+    """
+    Tests that a slow renderer does not slow down the simulation: shown-only frames are \n
+    dropped, every image year is still saved, and the result equals a synchronous run
+    """
+    def slow_update(*args, **kwargs):
+        time.sleep(0.02)
+
+    mocker.patch.object(BioSim, 'setup_graphics')
+    update = mocker.patch.object(BioSim, 'update_graphics', side_effect=slow_update)
+    save = mocker.patch.object(BioSim, 'save_graphics')
+    sim = BioSim(MAP, POPULATION, seed=5, async_graphics=True, max_frames=1)
+    sim.simulate(num_years=40, vis_years=1, img_years=10)
+
+    reference = BioSim(MAP, POPULATION, seed=5)
+    reference.simulate(num_years=40, vis_years=None)
+
+    assert sim.year == 40
+    assert save.call_count == 4
+    assert sim.frames_dropped > 0
+    assert update.call_count + sim.frames_dropped == 40
+    assert sim.num_animals_per_species == reference.num_animals_per_species
+
+
+def test_async_simulation_stops_when_drawing_raises(mocker):
+    """
+    Tests that the background simulation is stopped and joined when drawing raises
+    """
+    mocker.patch.object(BioSim, 'setup_graphics')
+    mocker.patch.object(BioSim, 'update_graphics', side_effect=ValueError)
+    sim = BioSim(MAP, POPULATION, seed=5, async_graphics=True, max_frames=1)
+    threads = threading.active_count()
+    with pytest.raises(ValueError):
+        sim.simulate(num_years=1000, vis_years=1, img_years=2)
+    year = sim.year
+    time.sleep(0.05)
+    assert threading.active_count() == threads
+    assert sim.year == year < 1000
+
+
+def test_unknown_histogram_property():
+    """
+    Tests that hist_specs with an unknown property raises a ValueError
+    """
+    with pytest.raises(ValueError):
+        BioSim(MAP, POPULATION, seed=1, hist_specs={'height': {'max': 2, 'delta': 0.1}})
+
+
+@pytest.mark.parametrize('engine', ['object', 'array'])
+def test_resumed_simulation_is_identical(engine, tmp_path):
+    """
+    Tests that a simulation loaded from a checkpoint continues exactly like the original
+    """
+    path = os.path.join(str(tmp_path), 'sim.npz')
+    sim = BioSim(MAP, POPULATION, seed=11, engine=engine, checkpoint_path=path,
+                 checkpoint_years=5)
+    sim.simulate(num_years=10, vis_years=None)
+    resumed = BioSim.load_checkpoint(path)
+    assert resumed.year == 10
+
+    sim.simulate(num_years=10, vis_years=None)
+    resumed.simulate(num_years=10, vis_years=None)
+    assert resumed.year == sim.year
+    expected, snapshot = sim.snapshot(), resumed.snapshot()
+    for species in sim.animal_species:
+        assert snapshot.counts[species].tolist() == expected.counts[species].tolist()
+        assert snapshot.weight[species].tolist() == expected.weight[species].tolist()
+        assert snapshot.age[species].tolist() == expected.age[species].tolist()
+
+
+def test_parameters_belong_to_one_simulation():
+    """
+    Tests that setting parameters in one simulation changes neither another simulation in \n
+    the same process nor the default parameters of the classes
+    """
+    from biosim.fauna import Herbivore
+    from biosim.landscape import Lowland
+    default_beta, default_f_max = Herbivore.parameters['beta'], Lowland.parameters['f_max']
+
+    changed = BioSim(MAP, POPULATION, seed=9)
+    changed.set_animal_parameters('Herbivore', {'beta': 0.1})
+    changed.set_landscape_parameters('L', {'f_max': 10})
+    reference = BioSim(MAP, POPULATION, seed=9)
+    sim = BioSim(MAP, POPULATION, seed=9)
+    run_years(changed, 5)
+
+    assert Herbivore.parameters['beta'] == default_beta
+    assert Lowland.parameters['f_max'] == default_f_max
+    assert sim.animal_species['Herbivore'].params.beta == default_beta
+    assert run_years(sim, 10) == run_years(reference, 10)
+
+
+def test_parameters_reach_worker_processes():
+    """
+    Tests that the parameters of a simulation are used by the worker processes
+    """
+    serial = BioSim(MAP, POPULATION, seed=4)
+    parallel = BioSim(MAP, POPULATION, seed=4, workers=2)
+    for sim in (serial, parallel):
+        sim.set_animal_parameters('Herbivore', {'beta': 0.2, 'F': 2})
+        sim.set_landscape_parameters('L', {'f_max': 50})
+    assert run_years(parallel, 8) == run_years(serial, 8)
+    parallel._map.close()
+
+
+def test_worker_pool_is_closed_after_an_error(mocker):
+    """
+    Tests that simulate shuts down the worker pool when a year raises
+    """
+    sim = BioSim(MAP, POPULATION, seed=5, workers=2)
+    mocker.patch.object(sim, 'simulate_year', side_effect=RuntimeError)
+    close = mocker.spy(sim._map, 'close')
+    with pytest.raises(RuntimeError):
+        sim.simulate(num_years=3, vis_years=None)
+    close.assert_called_once()
+
+
+@pytest.mark.parametrize('engine', ['object', 'array'])
+def test_snapshot_is_built_once_per_year(engine, mocker):
+    """
+    Tests that the animal properties of one year share one snapshot, and that a new one is \n
+    built after a year, after adding animals and after changing the parameters
+    """
+    sim = BioSim(MAP, POPULATION, seed=6, engine=engine)
+    snapshot = mocker.spy(sim._map, 'snapshot')
+    weights, ages, fitness = sim.animal_weights, sim.animal_ages, sim.animals_fitness
+    sim.animal_distribution
+    assert snapshot.call_count == 1
+    assert len(weights['Herbivore']) == len(ages['Herbivore']) == len(fitness['Herbivore'])
+
+    sim.simulate_year()
+    sim.animal_weights
+    assert snapshot.call_count == 2
+    sim.add_population(POPULATION)
+    assert len(sim.animal_ages['Carnivore']) == sim.num_animals_per_species['Carnivore']
+    old_fitness = sim.animals_fitness['Herbivore']
+    sim.set_animal_parameters('Herbivore', {'a_half': 2})
+    assert sim.animals_fitness['Herbivore'].tolist() != old_fitness.tolist()
+    assert snapshot.call_count == 4
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+Unit tests for methods in sweep.py
+"""
+__author__ = "Ashesh Raj Gnawali, Martin Bø"
+__email__ = "asgn@nmbu.no & mabo@nmbu.no"
+
+import os
+import pytest
+import numpy as np
+from biosim.sweep import Sweep, grid_design, latin_hypercube_design
+
+MAP = """\
+WWWW
+WLHW
+WWWW"""
+
+POPULATION = [{'loc': (2, 2),
+               'pop': [{'species': 'Herbivore', 'age': 5, 'weight': 20} for _ in range(20)] +
+                      [{'species': 'Carnivore', 'age': 5, 'weight': 20} for _ in range(3)]}]
+
+
+def test_grid_design():
+    """
+    Tests that the grid design contains every combination of values once
+    """
+    points = grid_design({('Herbivore', 'beta'): [0.5, 0.9], ('L', 'f_max'): [100, 200, 300]})
+    assert len(points) == 6
+    assert {(p[('Herbivore', 'beta')], p[('L', 'f_max')]) for p in points} == \
+        {(beta, f_max) for beta in (0.5, 0.9) for f_max in (100, 200, 300)}
+
+
+def test_latin_hypercube_uses_every_interval_once():
+    """
+    Tests that the points of a Latin hypercube cover every interval of every range once
+    """
+    space = {('Herbivore', 'mu'): (0.0, 1.0), ('H', 'f_max'): (100, 500)}
+    points = latin_hypercube_design(space, 10, seed=3)
+    for key, (low, high) in space.items():
+        intervals = [int((p[key] - low) / (high - low) * 10) for p in points]
+        assert sorted(intervals) == list(range(10))
+    assert points == latin_hypercube_design(space, 10, seed=3)
+
+
+def test_unknown_parameter_raises():
+    """
+    Tests that a point with an unknown parameter raises before anything is run
+    """
+    with pytest.raises(ValueError):
+        Sweep(MAP, POPULATION, [{('Herbivore', 'height'): 1}], num_years=2, seed=1)
+
+
+class TestSweep:
+    @pytest.fixture
+    def points(self):
+        return grid_design({('Herbivore', 'beta'): [0.3, 0.9], ('L', 'f_max'): [0, 800]})
+
+    def test_parameters_change_the_result(self, points):
+        """
+        Tests that the points give different results, and that the tidy table has one row \n
+        per point, replicate, year and species
+        """
+        sweep = Sweep(MAP, POPULATION, points, num_years=5, seed=2, num_replicates=2)
+        rows = sweep.run()
+        assert len(rows) == 4 * 2 * 5 * 2
+        assert set(rows[0]) == {'Herbivore.beta', 'L.f_max', 'point', 'replicate', 'year',
+                                'species', 'count'}
+        final = {row['point']: row['count'] for row in rows if row['year'] == 5 and
+                 row['species'] == 'Herbivore' and row['replicate'] == 0}
+        assert final[0] < final[1]
+
+    def test_workers_give_same_result(self, points):
+        """
+        Tests that running the points in worker processes gives the same table
+        """
+        serial = Sweep(MAP, POPULATION, points, num_years=4, seed=5).run()
+        parallel = Sweep(MAP, POPULATION, points, num_years=4, seed=5, workers=2).run()
+        assert parallel == serial
+
+    def test_resume_from_cache(self, points, tmp_path, mocker):
+        """
+        Tests that a sweep resumed from its cache only runs the points that are missing and \n
+        gives the same table as a sweep without cache
+        """
+        cache_dir = os.path.join(str(tmp_path), 'cache')
+        reference = Sweep(MAP, POPULATION, points, num_years=4, seed=5).run()
+        Sweep(MAP, POPULATION, points[:2], num_years=4, seed=5, cache_dir=cache_dir).run()
+
+        run_point = mocker.patch('biosim.sweep.run_point', wraps=__import__(
+            'biosim.sweep', fromlist=['run_point']).run_point)
+        sweep = Sweep(MAP, POPULATION, points, num_years=4, seed=5, cache_dir=cache_dir)
+        assert sweep.run() == reference
+        assert sweep.num_cached == 2
+        assert run_point.call_count == 2
+        assert len(os.listdir(cache_dir)) == 4
+        assert isinstance(sweep.results[0]['Herbivore'], np.ndarray)
+
+    def test_unseeded_sweeps_do_not_share_cache(self, points, tmp_path):
+        """
+        Tests that sweeps without seed never reuse each other's cached points, while the \n
+        same sweep finds its own points again
+        """
+        cache_dir = str(tmp_path)
+        first = Sweep(MAP, POPULATION, points[:1], num_years=2, seed=None, cache_dir=cache_dir)
+        first.run()
+        first.run()
+        assert first.num_cached == 1
+        second = Sweep(MAP, POPULATION, points[:1], num_years=2, seed=None, cache_dir=cache_dir)
+        second.run()
+        assert second.num_cached == 0
+        assert len(os.listdir(cache_dir)) == 2